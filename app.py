@@ -7,13 +7,12 @@
 # app.py
 from flask import Flask, render_template, request, jsonify
 import yaml
-import json
 from pathlib import Path
 from datetime import datetime
 import threading
 import time
 
-from streamer import Streamer
+from streamer import Streamer, read_recent_events
 from discovery import ONVIFDiscovery, scan_network_ports
 from monitor import NetworkMonitor, TelegramNotifier
 import cloud_uploader as cloud_uploader_module
@@ -108,43 +107,49 @@ def init_services():
         if stream.get('enabled', True):
             start_stream(stream)
 
+def _degrade_quality(status):
+    """Network became slow: switch all streams to low quality and alert"""
+    print("Network is slow, switching to low quality mode")
+    Streamer.set_low_quality(True)
+
+    # Send Telegram alert
+    if telegram_notifier:
+        telegram_notifier.send_network_slow_alert(
+            status['upload_mbps'],
+            status['threshold_mbps']
+        )
+
+def _restore_quality(status):
+    """Network recovered: switch all streams back to normal quality and alert"""
+    print("Network recovered, switching to normal quality")
+    Streamer.set_low_quality(False)
+
+    # Send Telegram alert
+    if telegram_notifier:
+        telegram_notifier.send_network_recovered_alert(
+            status['upload_mbps']
+        )
+
+def _keep_quality(status):
+    """Network state matches current quality mode: nothing to do"""
+
+# (is_slow, currently low quality) -> action
+_NETWORK_ACTIONS = {
+    (True, False): _degrade_quality,
+    (False, True): _restore_quality,
+    (True, True): _keep_quality,
+    (False, False): _keep_quality,
+}
+
 def monitor_network_quality():
     """Monitor network quality and adjust stream quality"""
-    global network_monitor, telegram_notifier
-    
-    was_slow = False
-    
     while True:
         try:
             time.sleep(10)  # Check every 10 seconds
             
             if network_monitor:
                 status = network_monitor.get_status()
-                is_slow = status['is_slow']
-                
-                # State changed
-                if is_slow and not was_slow:
-                    print("Network is slow, switching to low quality mode")
-                    Streamer.set_low_quality(True)
-                    
-                    # Send Telegram alert
-                    if telegram_notifier:
-                        telegram_notifier.send_network_slow_alert(
-                            status['upload_mbps'],
-                            status['threshold_mbps']
-                        )
-                
-                elif not is_slow and was_slow:
-                    print("Network recovered, switching to normal quality")
-                    Streamer.set_low_quality(False)
-                    
-                    # Send Telegram alert
-                    if telegram_notifier:
-                        telegram_notifier.send_network_recovered_alert(
-                            status['upload_mbps']
-                        )
-                
-                was_slow = is_slow
+                _NETWORK_ACTIONS[(status['is_slow'], Streamer._low_quality)](status)
                 
         except Exception as e:
             print(f"Network quality monitor error: {e}")
@@ -181,7 +186,8 @@ def start_stream(stream):
         # Create streamer with per-stream config
         streamer_config = config.copy()
         # Merge per-stream chunking/streaming settings
-        for key in ['streaming_enabled', 'chunking_enabled', 'chunk_duration', 'chunk_fps']:
+        for key in ['streaming_enabled', 'chunking_enabled', 'chunk_duration', 'chunk_fps',
+                    'chunk_passthrough', 'encoder', 'restream_passthrough']:
             if key in stream:
                 streamer_config[key] = stream[key]
 
@@ -234,20 +240,19 @@ def motion_log_page():
     log_dir = Path('logs')
     
     if log_dir.exists():
-        for event_file in log_dir.glob('events_*.json'):
+        for event_file in log_dir.glob('events_*.jsonl'):
             try:
-                with open(event_file, 'r') as f:
-                    events = json.load(f)
-                    stream_id = event_file.stem.replace('events_', '')
-                    # Get all events for scrolling
-                    for event in events:
-                        # Format: "2025-11-23 14:15:16 - MOTION - FPS: 25"
-                        timestamp = event['timestamp'].replace('T', ' ').split('.')[0]
-                        line = f"{timestamp} - {event['status']} - FPS: {event['fps']}"
-                        all_logs.append({
-                            'stream': stream_id,
-                            'line': line
-                        })
+                events = read_recent_events(event_file)
+                stream_id = event_file.stem.replace('events_', '')
+                # Get all events for scrolling
+                for event in events:
+                    # Format: "2025-11-23 14:15:16 - MOTION - FPS: 25"
+                    timestamp = event['timestamp'].replace('T', ' ').split('.')[0]
+                    line = f"{timestamp} - {event['status']} - FPS: {event['fps']}"
+                    all_logs.append({
+                        'stream': stream_id,
+                        'line': line
+                    })
             except:
                 pass
     
@@ -553,7 +558,8 @@ def api_motion_status():
     for stream_id, streamer in streamers.items():
         status[stream_id] = {
             'active': streamer.motion_active,
-            'fps': streamer._get_target_fps()
+            # fps the restream runs at, which lags motion by the hold time
+            'fps': streamer.pipeline_fps
         }
     return jsonify(status)
 
@@ -610,11 +616,10 @@ def api_get_motion_events():
     log_dir = Path('logs')
     
     if log_dir.exists():
-        for event_file in log_dir.glob('events_*.json'):
+        for event_file in log_dir.glob('events_*.jsonl'):
             try:
-                with open(event_file, 'r') as f:
-                    stream_id = event_file.stem.replace('events_', '')
-                    events[stream_id] = json.load(f)
+                stream_id = event_file.stem.replace('events_', '')
+                events[stream_id] = read_recent_events(event_file)
             except:
                 pass
     
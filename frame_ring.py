@@ -0,0 +1,39 @@
+"""
+Frame Ring
+Fixed pool of preallocated frame buffers handed between threads by index
+"""
+
+from collections import deque
+
+import numpy as np
+
+
+class FrameRing:
+    """Preallocated frame slots with a free-list of slot indices.
+
+    The capture thread decodes straight into a slot it has acquired and
+    passes the slot index to consumers, which release it when done. Frames
+    are never copied or reallocated per capture.
+    """
+
+    def __init__(self, shape, size, dtype=np.uint8):
+        """
+        Initialize frame ring
+
+        Args:
+            shape: Frame shape, e.g. (height, width, 3)
+            size: Number of slots to preallocate
+            dtype: Pixel data type
+        """
+        self.shape = tuple(shape)
+        self.frames = np.empty((size,) + self.shape, dtype=dtype)
+        # deque append/popleft are atomic, so no extra lock is needed
+        self._free = deque(range(size))
+
+    def acquire(self):
+        """Take a free slot index. Raises IndexError if all slots are in use."""
+        return self._free.popleft()
+
+    def release(self, idx):
+        """Return a slot index to the free-list."""
+        self._free.append(idx)
@@ -129,19 +129,24 @@ class NetworkMonitor:
 class TelegramNotifier:
     """Send Telegram notifications for network issues"""
     
-    def __init__(self, bot_token, chat_id):
+    def __init__(self, bot_token, chat_id, clock=time.monotonic):
         """
         Initialize Telegram notifier
         
         Args:
             bot_token: Telegram bot token
             chat_id: Telegram chat ID
+            clock: Returns seconds for the alert cooldown (monotonic by default)
         """
         self.bot_token = bot_token
         self.chat_id = chat_id
         self.enabled = bool(bot_token and chat_id)
         self.last_alert_time = {}
         self.alert_cooldown = 300  # 5 minutes between alerts
+        self.clock = clock
+        # requests.Session created on the first alert; keeps the connection
+        # to api.telegram.org alive between alerts
+        self._session = None
         
     def send_alert(self, message, alert_type='network'):
         """
@@ -155,13 +160,13 @@ class TelegramNotifier:
             return False
         
         # Check cooldown
-        now = time.time()
+        now = self.clock()
         if alert_type in self.last_alert_time:
             if now - self.last_alert_time[alert_type] < self.alert_cooldown:
                 return False  # Still in cooldown
         
         try:
-            import requests
+            session = self._get_session()
             
             url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
             data = {
@@ -170,7 +175,7 @@ class TelegramNotifier:
                 'parse_mode': 'HTML'
             }
             
-            response = requests.post(url, data=data, timeout=10)
+            response = session.post(url, data=data, timeout=10)
             
             if response.status_code == 200:
                 self.last_alert_time[alert_type] = now
@@ -184,6 +189,17 @@ class TelegramNotifier:
             print(f"Telegram error: {e}")
             return False
     
+    def _get_session(self):
+        """Return the pooled HTTP session, creating it on first use"""
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            
+            session = requests.Session()
+            session.mount('https://', HTTPAdapter(pool_connections=2, pool_maxsize=4))
+            self._session = session
+        return self._session
+    
     def send_network_slow_alert(self, current_mbps, threshold_mbps):
         """Send network slow alert"""
         message = (
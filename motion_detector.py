@@ -33,13 +33,23 @@ class MotionDetector:
         self.last_motion = 0
         self.last_motion_state = False
         self.lock = Lock()
-
-    def detect(self, frame_bgr):
+        # Preallocated downsample/gray buffers, sized on the first frame
+        self._small_bgr = None
+        self._gray_raw = None
+        # Blurred frames alternate between two buffers so prev_frame stays intact
+        self._gray_bufs = None
+        self._gray_idx = 0
+        # Zones rasterized at the detection size; rebuilt when zones/size change
+        self._zone_mask = None
+
+    def detect(self, frame_bgr, prescaled=False):
         """
         Detect motion in frame with frame skipping optimization
 
         Args:
-            frame_bgr: OpenCV BGR format frame
+            frame_bgr: OpenCV BGR format frame, or a single-channel gray frame
+            prescaled: Frame is gray and already downscaled by detection_scale
+                (e.g. by the decoder), so it is used without resizing
 
         Returns:
             bool: True if motion detected or still in cooldown period
@@ -53,15 +63,33 @@ class MotionDetector:
 
             # Calculate scaled dimensions based on detection_scale
             h, w = frame_bgr.shape[:2]
-            scaled_w = int(w * self.detection_scale)
-            scaled_h = int(h * self.detection_scale)
-
-            # Downsample for faster processing
-            frame_bgr = cv2.resize(frame_bgr, (scaled_w, scaled_h), interpolation=cv2.INTER_AREA)
-
-            # Convert to grayscale and blur to reduce noise (optimized kernel size)
-            gray = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY)
-            gray = cv2.GaussianBlur(gray, (self.blur_kernel, self.blur_kernel), 0)
+            if prescaled:
+                scaled_w, scaled_h = w, h
+            else:
+                scaled_w = int(w * self.detection_scale)
+                scaled_h = int(h * self.detection_scale)
+
+            self._ensure_buffers(scaled_w, scaled_h)
+
+            # Downsample first so the color conversion and blur only touch
+            # the small frame; all steps write into preallocated buffers
+            small_gray = self._gray_raw
+            if prescaled:
+                small_gray = frame_bgr
+            elif frame_bgr.ndim == 2:
+                # Already gray (luma-only capture); no color conversion needed
+                cv2.resize(frame_bgr, (scaled_w, scaled_h), dst=self._gray_raw,
+                           interpolation=cv2.INTER_AREA)
+            else:
+                cv2.resize(frame_bgr, (scaled_w, scaled_h), dst=self._small_bgr,
+                           interpolation=cv2.INTER_AREA)
+                # Convert to grayscale
+                cv2.cvtColor(self._small_bgr, cv2.COLOR_BGR2GRAY, dst=self._gray_raw)
+
+            # Blur to reduce noise (optimized kernel size)
+            self._gray_idx ^= 1
+            gray = self._gray_bufs[self._gray_idx]
+            cv2.GaussianBlur(small_gray, (self.blur_kernel, self.blur_kernel), 0, dst=gray)
 
             # Initialize previous frame on first run
             if self.prev_frame is None:
@@ -78,30 +106,20 @@ class MotionDetector:
 
             # Apply zones if configured
             if self.zones:
-                mask = np.zeros_like(thresh)
-                for zone in self.zones:
-                    if len(zone) == 4:
-                        # Convert to integers to ensure valid slice indices
-                        x, y, w, h = int(zone[0]), int(zone[1]), int(zone[2]), int(zone[3])
-                        # Scale zone coordinates
-                        x = int(x * self.detection_scale)
-                        y = int(y * self.detection_scale)
-                        w = int(w * self.detection_scale)
-                        h = int(h * self.detection_scale)
-                        # Ensure coordinates are within bounds
-                        x = max(0, min(x, thresh.shape[1]))
-                        y = max(0, min(y, thresh.shape[0]))
-                        w = max(0, min(w, thresh.shape[1] - x))
-                        h = max(0, min(h, thresh.shape[0] - y))
-                        mask[y:y+h, x:x+w] = 255
-                thresh = cv2.bitwise_and(thresh, thresh, mask=mask)
-
-            # Find contours
-            contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-            # Check if any contour is large enough (scale min_area accordingly)
-            scaled_min_area = self.min_area * (self.detection_scale ** 2)
-            motion = any(cv2.contourArea(c) > scaled_min_area for c in contours)
+                if self._zone_mask is None:
+                    self._zone_mask = self._build_zone_mask(thresh.shape)
+                cv2.bitwise_and(thresh, self._zone_mask, dst=thresh)
+
+            # Most frames have no changed pixels at all; skip the contour scan
+            if cv2.countNonZero(thresh) == 0:
+                motion = False
+            else:
+                # Find contours
+                contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+                # Check if any contour is large enough (scale min_area accordingly)
+                scaled_min_area = self.min_area * (self.detection_scale ** 2)
+                motion = any(cv2.contourArea(c) > scaled_min_area for c in contours)
 
             if motion:
                 self.last_motion = time.time()
@@ -112,6 +130,37 @@ class MotionDetector:
             self.last_motion_state = motion or (time.time() - self.last_motion < self.cooldown)
             return self.last_motion_state
 
+    def _build_zone_mask(self, shape):
+        """Rasterize the detection zones into a mask at the detection size."""
+        mask = np.zeros(shape, dtype=np.uint8)
+        for zone in self.zones:
+            if len(zone) == 4:
+                # Convert to integers to ensure valid slice indices
+                x, y, w, h = int(zone[0]), int(zone[1]), int(zone[2]), int(zone[3])
+                # Scale zone coordinates
+                x = int(x * self.detection_scale)
+                y = int(y * self.detection_scale)
+                w = int(w * self.detection_scale)
+                h = int(h * self.detection_scale)
+                # Ensure coordinates are within bounds
+                x = max(0, min(x, shape[1]))
+                y = max(0, min(y, shape[0]))
+                w = max(0, min(w, shape[1] - x))
+                h = max(0, min(h, shape[0] - y))
+                mask[y:y+h, x:x+w] = 255
+        return mask
+
+    def _ensure_buffers(self, scaled_w, scaled_h):
+        """(Re)allocate the working buffers when the detection size changes."""
+        if self._gray_raw is not None and self._gray_raw.shape == (scaled_h, scaled_w):
+            return
+        self._small_bgr = np.empty((scaled_h, scaled_w, 3), dtype=np.uint8)
+        self._gray_raw = np.empty((scaled_h, scaled_w), dtype=np.uint8)
+        self._gray_bufs = [np.empty((scaled_h, scaled_w), dtype=np.uint8) for _ in range(2)]
+        # The previous frame and zone mask no longer match the new size
+        self.prev_frame = None
+        self._zone_mask = None
+
     def update_settings(self, sensitivity=None, min_area=None, zones=None, cooldown=None,
                         detection_scale=None, blur_kernel=None, frame_skip=None):
         """Update detector settings on the fly"""
@@ -122,10 +171,12 @@ class MotionDetector:
                 self.min_area = min_area
             if zones is not None:
                 self.zones = zones
+                self._zone_mask = None
             if cooldown is not None:
                 self.cooldown = cooldown
             if detection_scale is not None:
                 self.detection_scale = detection_scale
+                self._zone_mask = None
             if blur_kernel is not None:
                 self.blur_kernel = blur_kernel if blur_kernel % 2 == 1 else blur_kernel + 1
             if frame_skip is not None:
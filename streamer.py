@@ -3,23 +3,149 @@ Minimal streamer implementation used by tests and runtime.
 
 This file intentionally keeps a small surface area and consistent 4-space
 indentation to avoid previous IndentationError issues. Behavior is a subset
-of the full agent: it supports SRT target construction and a simple
-dynamic-bitrate policy used by the rest of the codebase.
+of the full agent: motion-aware RTSP restreaming with a simple
+dynamic-bitrate policy, plus motion-triggered chunk recording.
 """
 
+import os
+import re
+import selectors
 import subprocess
-import shlex
 import shutil
 import threading
 import time
 import queue
+from collections import Counter, deque
 from pathlib import Path
 import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import json
+import uuid
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
 
+import cv2
+
+from frame_ring import FrameRing
 from motion_detector import MotionDetector
 
+# Hardware H.264 decoders for capture, in order of preference, with the
+# device node that must exist for each (NVIDIA, Raspberry Pi, Rockchip)
+_HW_DECODERS = (
+    ('h264_cuvid', '/dev/nvidia0'),
+    ('h264_v4l2m2m', '/dev/video10'),
+    ('h264_rkmpp', '/dev/mpp_service'),
+)
+
+# Hardware H.264 encoders for the restream, in order of preference, with the
+# device node that must exist for each (NVIDIA, Intel/AMD VA-API, Raspberry
+# Pi, Rockchip)
+_HW_ENCODERS = (
+    ('h264_nvenc', '/dev/nvidia0'),
+    ('h264_vaapi', '/dev/dri/renderD128'),
+    ('h264_v4l2m2m', '/dev/video11'),
+    ('h264_rkmpp', '/dev/mpp_service'),
+)
+
+# Restream codec arguments per encoder; the rate control (-b:v etc.) is
+# appended by _argv_for. Unknown names fall back to libx264.
+_ENCODER_ARGS = {
+    'h264_nvenc': ('-c:v', 'h264_nvenc', '-preset', 'p1', '-tune', 'll', '-rc', 'cbr'),
+    # hwupload passes GPU frames through and uploads software-decoded ones
+    'h264_vaapi': ('-vf', 'format=nv12|vaapi,hwupload', '-c:v', 'h264_vaapi'),
+    'h264_v4l2m2m': ('-c:v', 'h264_v4l2m2m', '-pix_fmt', 'yuv420p',
+                     '-num_output_buffers', '32', '-num_capture_buffers', '16'),
+    'h264_rkmpp': ('-c:v', 'h264_rkmpp'),
+    # zerolatency drops lookahead and B-frames; keyframes only on the -g grid
+    'libx264': ('-c:v', 'libx264', '-preset', 'ultrafast', '-tune', 'zerolatency',
+                '-sc_threshold', '0', '-x264-params', 'nal-hrd=cbr:force-cfr=1'),
+}
+
+# Input arguments that decode on the same GPU as the encoder and keep the
+# frames there, so they are not copied to system memory and back. Both
+# encoders also accept frames if ffmpeg falls back to software decode.
+_ENCODER_INPUT_ARGS = {
+    'h264_nvenc': ('-hwaccel', 'cuda', '-hwaccel_output_format', 'cuda'),
+    'h264_vaapi': ('-vaapi_device', '/dev/dri/renderD128',
+                   '-hwaccel', 'vaapi', '-hwaccel_output_format', 'vaapi'),
+}
+
+# Compact encoder for event log lines; json.dumps builds a new encoder per
+# call whenever non-default options such as separators are passed
+_EVENT_ENCODER = json.JSONEncoder(separators=(',', ':'))
+
+# OpenCV's log level setter moved from cv2 (4.x) to cv2.utils.logging (5.x)
+_cv_logging = getattr(getattr(cv2, 'utils', None), 'logging', None)
+if not hasattr(_cv_logging, 'setLogLevel'):
+    _cv_logging = cv2
+_CV_LOG_LEVEL_ERROR = 2
+
+# MPEG-TS output options: no mux delay or preload and a PCR every 20 ms,
+# so the restream's first bytes go out without waiting on the muxer
+_TS_OUTPUT_ARGS = ('-muxdelay', '0', '-muxpreload', '0', '-pcr_period', '20',
+                   '-f', 'mpegts', 'pipe:1')
+
+# Input options that stop ffmpeg buffering and reordering RTSP frames, so
+# motion is detected on current frames rather than ones 1-2 s old. Stream
+# probing is capped at 1 s / 500 kB (default 5 s / 5 MB) to shorten start-up
+# and reconnects; that still covers the SPS that carries the resolution.
+_LOW_DELAY_INPUT_ARGS = ['-fflags', 'nobuffer', '-flags', 'low_delay', '-reorder_queue_size', '0',
+                         '-probesize', '500000', '-analyzeduration', '1000000']
+_LOW_DELAY_CAPTURE_OPTIONS = ('rtsp_transport;tcp|fflags;nobuffer|flags;low_delay'
+                              '|reorder_queue_size;0|max_delay;0'
+                              '|probesize;500000|analyzeduration;1000000')
+
+# WxH in ffmpeg's "Stream #... Video:" banner line
+_RESOLUTION_RE = re.compile(r'(\d{3,4})x(\d{3,4})')
+
+# Failure wording in ffmpeg stderr; see _is_decoder_error
+_FAILURE_RE = re.compile(r'error|fail|could not|cannot|invalid|unsupported|unknown|not found', re.I)
+
+
+def _is_decoder_error(line, decoder):
+    """Whether an ffmpeg stderr line reports a failure of the video decoder.
+
+    Lines logged by the decoder itself ("[h264_v4l2m2m @ ...]", or
+    "[dec:h264_v4l2m2m @ ...]" in ffmpeg 7) or about a decoder or hwaccel
+    count; connection and input errors, e.g. an offline camera, do not.
+    """
+    if not _FAILURE_RE.search(line):
+        return False
+    lowered = line.lower()
+    return f'{decoder} @' in line or 'decoder' in lowered or 'hwaccel' in lowered
+
+
+class _StreamLogRouter(logging.Handler):
+    """Dispatch queued log records to per-stream file handlers by logger name."""
+
+    def __init__(self):
+        super().__init__()
+        self._handlers = {}
+
+    def emit(self, record):
+        # Open/close requests travel through the queue in order with the
+        # records, so a restarted stream never loses or steals a handler
+        opened = getattr(record, 'open_handler', None)
+        if opened is not None:
+            old = self._handlers.pop(record.name, None)
+            if old is not None:
+                old.close()
+            self._handlers[record.name] = opened
+            return
+        if getattr(record, 'close_stream', False):
+            handler = self._handlers.pop(record.name, None)
+            if handler is not None:
+                handler.flush()
+                try:
+                    os.fsync(handler.stream.fileno())
+                except (AttributeError, OSError, ValueError):
+                    pass
+                handler.close()
+            return
+        handler = self._handlers.get(record.name)
+        if handler is not None:
+            handler.handle(record)
+
 
 class Streamer:
     """Compact RTSP streamer with dynamic bitrate.
@@ -27,19 +153,76 @@ class Streamer:
     Public methods used elsewhere: set_low_quality(enabled), restart_all()
     """
 
-    _instances = []
+    _instances = set()
     _low_quality = False
     _lock = threading.Lock()
     # path to ffmpeg if available on PATH (updated by autodetect)
     _ffmpeg_path = shutil.which('ffmpeg')
+    # whether the shared ffmpeg watcher thread is running
+    _watcher_running = False
+    # selector polled by the one thread that drains every restream's stderr
+    _stderr_selector = None
+    # restream video encoder, probed once from `ffmpeg -encoders`
+    _hw_encoder = None
+    # capture H.264 decoder ('' = software), probed once from `ffmpeg -decoders`
+    _hw_decoder = None
+    # process-wide log queue drained by one listener thread (see _setup_logger)
+    _log_queue = queue.SimpleQueue()
+    _log_listener = None
+    _log_router = None
+    _log_formatter = logging.Formatter('%(asctime)s - %(message)s')
+    # capture threads inside a gray retrieve, and the OpenCV log level they
+    # raised; see _quiet_opencv
+    _cv_quiet_lock = threading.Lock()
+    _cv_quiet_count = 0
+    _cv_saved_log_level = None
+    # capture slot + published frames (2) + slot being encoded
+    _frame_ring_size = 4
+    _max_ready_frames = 2
+    # motion event log: lines kept on compaction, and how often to compact
+    _event_keep = 100
+    _event_compact_every = 1000
+
+    @property
+    def motion_active(self):
+        """Whether motion (or its cooldown) is currently active."""
+        return self._motion_event.is_set()
+
+    @motion_active.setter
+    def motion_active(self, value):
+        if value:
+            self._motion_event.set()
+        else:
+            self._motion_event.clear()
+
+    @property
+    def pipeline_fps(self):
+        """FPS target of the running restream (the smoothed motion state).
+
+        Differs from the live motion state's target during the hysteresis and
+        minimum-hold windows of _process_motion.
+        """
+        return self._get_target_fps(bool(self._pipeline_motion))
 
     def __init__(self, rtsp_url, config, stream_id):
         self.rtsp_url = rtsp_url
         self.stream_id = stream_id
         self.config = config
-        self.motion_active = False
-        self.frame_queue = queue.Queue(maxsize=2)
+        # Backs motion_active; the chunking thread waits on it
+        self._motion_event = threading.Event()
+        # (FrameRing, slot index) pairs published by capture for chunking.
+        # Single producer/single consumer, and deque append/popleft are
+        # atomic, so no queue mutex is taken per frame.
+        self._ready_frames = deque()
+        # Set by capture after publishing; chunking blocks on it when the
+        # deque is empty instead of polling
+        self._frame_ready = threading.Event()
         self.running = True
+        # serializes pipeline restarts between callers and the watchdog
+        self._pipeline_lock = threading.Lock()
+        # set to have the pipeline thread restart ffmpeg; exists before the
+        # streamer is registered, as set_low_quality/restart_all set it
+        self._restart_event = threading.Event()
 
         self.detector = MotionDetector(
             sensitivity=config.get('motion_sensitivity', 25),
@@ -53,203 +236,333 @@ class Streamer:
 
         self.default_bitrate = int(config.get('default_bitrate', 2000000))
         self.low_bitrate = int(config.get('low_bitrate', max(400000, self.default_bitrate // 4)))
+        self._apply_config(config)
 
-        self.logger = self._setup_logger()
+        # Registered before the logger so a streamer stopping concurrently
+        # sees this one and keeps the shared log listener running. _lock
+        # guards _instances and the listener's lifetime.
+        with Streamer._lock:
+            Streamer._instances.add(self)
 
-        self._instances.append(self)
+        self.logger = self._setup_logger()
+        self._open_event_log()
 
         # per-instance flag to avoid repeated missing-ffmpeg spam
         self._ffmpeg_warned = False
-
-        # If ffmpeg not present at startup, start a watcher thread that will
-        # poll for ffmpeg appearing on PATH and start the pipeline when found.
+        # set once the hardware capture decoder fails (see _is_decoder_error)
+        self._hw_decoder_failed = False
+        # whether the ffmpeg capture currently decodes gray frames
+        self._capture_gray = False
+        # whether those frames are already at the detector's size
+        self._capture_prescaled = False
+        # argv of the running restream, to skip restarts that change nothing
+        self._last_argv = None
+        # last stderr lines of the running restream (see _watch_stderr)
+        self._ffmpeg_stderr_tail = deque(maxlen=20)
+        # set once the hardware chunk encoder fails so later chunks skip it
+        self._hw_chunk_encode_failed = False
+
+        # If ffmpeg not present at startup, make sure the shared watcher is
+        # polling for ffmpeg appearing on PATH; it starts our pipeline when found.
         if not Streamer._ffmpeg_path:
-            threading.Thread(target=self._ffmpeg_watcher, daemon=True).start()
-
+            Streamer._start_ffmpeg_watcher()
+
+        # Motion state tracked across frames by _process_motion
+        # smoothed motion state the restream runs at (None until first motion);
+        # the argv is built from it, not from the live motion_active
+        self._pipeline_motion = None
+        self._last_switch_ts = 0.0
+        # restream argv per (url, fps, bitrate, encoder); see _build_ffmpeg_command
+        self._argv_cache = {}
+        # recent motion samples; the pipeline follows their mode
+        self._target_window = deque(maxlen=10)
+        # smoothed target and when it last changed (hysteresis)
+        self._pending_target = None
+        self._pending_since = 0.0
+        self._motion_frame_count = 0
+        self._no_motion_frame_count = 0
+        # 5-second window of the last logged transition (see _log_transition)
+        self._transition_bucket = None
+        self._suppressed_transitions = 0
+
+        self._chunking_lock = threading.Lock()
+        self._chunking_thread = None
+
+        # Capture and motion detection share one thread per streamer
         threading.Thread(target=self._capture_loop, daemon=True).start()
-        threading.Thread(target=self._motion_loop, daemon=True).start()
-        # Start chunking thread if enabled
-        threading.Thread(target=self._chunking_loop, daemon=True).start()
+        threading.Thread(target=self._watch_pipeline, daemon=True).start()
+        # Start chunking thread only if enabled; update_config starts it later
+        self._sync_chunking_thread()
         # do not start external processes in constructor for test-safety
     # SRT streaming logic removed for MediaMTX relay. Only RTSP and chunking remain.
     
     def _chunking_loop(self):
-        """Motion-triggered video chunking pipeline."""
-        import cv2
-        import uuid
-        while self.running:
-            try:
-                # Check config for chunking enabled
-                chunking_enabled = self.config.get('chunking_enabled', False)
-                chunk_duration = int(self.config.get('chunk_duration', 5))
-                chunk_fps = int(self.config.get('chunk_fps', 2))
-                if not chunking_enabled:
-                    time.sleep(1)
-                    continue
-                # Wait for motion
-                if not self.motion_active:
-                    time.sleep(0.2)
-                    continue
-                # Start chunk capture
-                frames = []
-                start_time = time.time()
-                while time.time() - start_time < chunk_duration and self.motion_active and self.running:
+        """Motion-triggered video chunking pipeline.
+
+        While motion is active, frames are streamed into one long-running
+        ffmpeg segment muxer that cuts a new chunk file every chunk_duration
+        seconds, so encoder start-up is paid once per motion episode instead
+        of once per chunk. Finished chunks are picked up by a reader thread
+        (see _collect_chunks) and queued for upload.
+        """
+        proc = None
+        hardware = False
+        try:
+            while self.running:
+                # Exit when chunking gets disabled; checked under the lock so a
+                # concurrent _sync_chunking_thread never sees a dying thread as alive
+                with self._chunking_lock:
+                    if not self._chunking_enabled:
+                        self._chunking_thread = None
+                        return
+                try:
+                    chunk_fps = self._chunk_fps
+                    # Wait for motion; the last chunk is finalized when it ends
+                    if not self.motion_active:
+                        if proc is not None:
+                            self._finish_chunk_encoder(proc, hardware)
+                            proc = None
+                        # Times out so chunking_enabled and running are rechecked
+                        self._motion_event.wait(timeout=1.0)
+                        continue
+                    if self._chunk_passthrough:
+                        # ffmpeg reads the camera itself; keep it running while motion lasts
+                        if proc is None:
+                            hardware = False
+                            proc = self._open_chunk_passthrough()
+                        time.sleep(0.2)
+                        continue
                     try:
-                        frame = self.frame_queue.get(timeout=1)
-                        # Create a copy to avoid holding references to large frame buffers
-                        frames.append(frame.copy())
-                    except queue.Empty:
-                        pass
+                        ring, slot = self._ready_frames.popleft()
+                    except IndexError:
+                        # Sleep until capture publishes a frame. Cleared before
+                        # the recheck so a frame published in between still wakes us.
+                        self._frame_ready.clear()
+                        if not self._ready_frames:
+                            self._frame_ready.wait(timeout=1.0)
+                        continue
+                    try:
+                        frame = ring.frames[slot]
+                        if proc is None:
+                            # Open the encoder once the frame size is known
+                            hardware = not self._hw_chunk_encode_failed
+                            h, w = frame.shape[:2]
+                            proc = self._open_chunk_encoder(w, h, chunk_fps, hardware)
+                        if not self._write_chunk_frame(proc, frame) and hardware:
+                            # Hardware encoder died (typically right after init);
+                            # switch to software and resend the current frame
+                            self.logger.warning("Hardware encoding failed, falling back to software encoding")
+                            self._hw_chunk_encode_failed = True
+                            self._finish_chunk_encoder(proc, hardware)
+                            hardware = False
+                            proc = self._open_chunk_encoder(w, h, chunk_fps, hardware)
+                            self._write_chunk_frame(proc, frame)
+                    finally:
+                        # Hand the slot back to the capture thread
+                        frame = None
+                        ring.release(slot)
+                    # Paces frames to the encoder's input rate
                     time.sleep(1.0 / max(1, chunk_fps))
-                if frames:
-                    # Save chunk to file using hardware encoding if available
-                    chunk_id = str(uuid.uuid4())[:8]
-                    ts_start = int(start_time)
-                    ts_end = int(time.time())
-                    out_dir = Path('tmp/chunks')
-                    out_dir.mkdir(parents=True, exist_ok=True)
-                    out_path = out_dir / f"{self.stream_id}_{chunk_id}.mp4"
-
-                    # Try hardware encoding first, fallback to software
-                    success = self._encode_chunk_hardware(frames, out_path, chunk_fps)
-                    if not success:
-                        self.logger.warning("Hardware encoding failed, falling back to software encoding")
-                        success = self._encode_chunk_software(frames, out_path, chunk_fps)
-
-                    if success:
-                        self.logger.info(f"Chunk saved: {out_path}")
-                        # Upload to cloud
-                        self._upload_chunk_to_cloud(out_path, chunk_id, ts_start, ts_end)
-                    else:
-                        self.logger.error(f"Failed to encode chunk {chunk_id}")
-            except Exception as e:
-                self.logger.error(f"Chunking error: {e}")
-            time.sleep(0.5)
+                except Exception as e:
+                    self.logger.error(f"Chunking error: {e}")
+                    time.sleep(0.5)
+        finally:
+            if proc is not None:
+                self._finish_chunk_encoder(proc, hardware)
+            # Return unconsumed frames to their rings, so a later chunking
+            # thread starts with every spare slot free and no stale frames
+            while True:
+                try:
+                    ring, slot = self._ready_frames.popleft()
+                except IndexError:
+                    break
+                ring.release(slot)
 
-    def _encode_chunk_hardware(self, frames, out_path, fps):
-        """Encode video chunk using hardware encoder (h264_v4l2m2m)."""
-        try:
-            import cv2
-            if not frames:
-                return False
+    def _sync_chunking_thread(self):
+        """Start the chunking thread if chunking is enabled and it is not running.
 
-            h, w = frames[0].shape[:2]
+        The thread stops itself once chunking is disabled, so disabled
+        streamers do not keep an idle thread around.
+        """
+        with self._chunking_lock:
+            if self.running and self._chunking_enabled and self._chunking_thread is None:
+                self._chunking_thread = threading.Thread(target=self._chunking_loop, daemon=True)
+                self._chunking_thread.start()
 
-            # FFmpeg command with hardware encoding
-            cmd = [
-                'ffmpeg',
-                '-y',  # Overwrite output
-                '-f', 'rawvideo',
-                '-vcodec', 'rawvideo',
-                '-pix_fmt', 'bgr24',
-                '-s', f'{w}x{h}',
-                '-r', str(fps),
-                '-i', '-',  # Read from stdin
+    def _open_chunk_encoder(self, w, h, fps, hardware):
+        """Start an ffmpeg segment encoder reading raw BGR frames from stdin.
+
+        Chunks are written to tmp/chunks/<stream_id>_<session>_NNN.mp4 and
+        announced on the encoder's stdout, which a reader thread consumes.
+        """
+        out_dir = Path('tmp/chunks')
+        out_dir.mkdir(parents=True, exist_ok=True)
+        session_id = str(uuid.uuid4())[:8]
+        out_pattern = out_dir / f"{self.stream_id}_{session_id}_%03d.mp4"
+
+        cmd = [
+            'ffmpeg',
+            '-y',  # Overwrite output
+            '-loglevel', 'error',  # stderr is only read once the encoder exits
+            '-f', 'rawvideo',
+            '-vcodec', 'rawvideo',
+            '-pix_fmt', 'bgr24',
+            '-s', f'{w}x{h}',
+            '-r', str(fps),
+            '-i', '-',  # Read from stdin
+        ] + self._chunk_codec_args(w, h, fps, hardware) + self._chunk_segment_args(out_pattern)
+
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        threading.Thread(target=self._collect_chunks, args=(proc, out_dir, time.time()),
+                         daemon=True).start()
+        return proc
+
+    def _open_chunk_passthrough(self):
+        """Start an ffmpeg recorder that stream-copies the camera into chunks.
+
+        The camera's H.264 is remuxed as-is, so nothing is decoded or
+        re-encoded; chunks can only be cut at the camera's own keyframes.
+        Audio is dropped, as in the encoded chunks. ffmpeg is stopped with SIGTERM, which still finalizes the last chunk.
+        """
+        out_dir = Path('tmp/chunks')
+        out_dir.mkdir(parents=True, exist_ok=True)
+        session_id = str(uuid.uuid4())[:8]
+        out_pattern = out_dir / f"{self.stream_id}_{session_id}_%03d.mp4"
+
+        segment_args = self._chunk_segment_args(out_pattern)
+        cmd = [
+            'ffmpeg',
+            '-y',
+            '-loglevel', 'error',
+            '-rtsp_transport', 'tcp',
+            '-i', self.rtsp_url,
+            '-map', '0:v',
+            '-an',  # camera audio is often G.711, which mp4 cannot hold
+            '-c:v', 'copy',
+        ] + segment_args[segment_args.index('-f'):]  # no keyframes to force when copying
+
+        self.logger.info("Recording chunks by stream copy (no re-encode)")
+        proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        threading.Thread(target=self._collect_chunks, args=(proc, out_dir, time.time()),
+                         daemon=True).start()
+        return proc
+
+    def _chunk_codec_args(self, w, h, fps, hardware):
+        """Encoder arguments for chunks: h264_v4l2m2m, or libx264 as fallback."""
+        if hardware:
+            self.logger.info(f"Attempting hardware encoding: {w}x{h} @ {fps}fps")
+            return [
                 '-c:v', 'h264_v4l2m2m',  # Hardware encoder
                 '-num_output_buffers', '32',
                 '-num_capture_buffers', '16',
                 '-b:v', '1M',  # 1 Mbps bitrate for chunks
                 '-pix_fmt', 'yuv420p',
-                str(out_path)
             ]
 
-            self.logger.info(f"Attempting hardware encoding: {w}x{h} @ {fps}fps")
-            proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-            # Write frames to ffmpeg stdin
-            for frame in frames:
-                try:
-                    proc.stdin.write(frame.tobytes())
-                except BrokenPipeError:
-                    self.logger.warning("Hardware encoding pipe broken during write")
-                    break
-
-            proc.stdin.close()
-            stdout, stderr = proc.communicate(timeout=10)
-
-            success = proc.returncode == 0 and out_path.exists()
-
-            if success:
-                self.logger.info(f"✓ Hardware encoding succeeded: {out_path.name}")
-            else:
-                self.logger.warning(f"✗ Hardware encoding failed (returncode={proc.returncode})")
-                if stderr:
-                    # Log first 500 chars of error for debugging
-                    error_msg = stderr.decode('utf-8', errors='ignore')[:500]
-                    self.logger.debug(f"FFmpeg stderr: {error_msg}")
+        # Get encoding preset from config (default: ultrafast for low CPU)
+        preset = self.config.get('encoding_preset', 'ultrafast')
+        crf = self.config.get('encoding_crf', 28)  # Quality: 18-28 (higher=smaller file, lower quality)
+        self.logger.info(f"Software encoding (libx264): {w}x{h} @ {fps}fps, preset={preset}, crf={crf}")
+        return [
+            '-c:v', 'libx264',
+            '-preset', preset,  # ultrafast = lowest CPU, fast encode
+            '-tune', 'zerolatency',  # Optimize for real-time encoding
+            '-crf', str(crf),  # Constant quality mode
+            '-pix_fmt', 'yuv420p',
+        ]
+
+    def _chunk_segment_args(self, out_pattern):
+        """Output arguments shared by both chunk encoders.
+
+        A keyframe is forced at every chunk boundary so the segment muxer can
+        cut exactly there; each finished chunk is listed on stdout as
+        ``name,start,end``.
+        """
+        duration = self._chunk_duration
+        return [
+            '-force_key_frames', f'expr:gte(t,n_forced*{duration})',
+            '-f', 'segment',
+            '-segment_time', str(duration),
+            '-segment_format', 'mp4',
+            '-segment_format_options', 'movflags=+faststart',  # Enable streaming playback
+            '-reset_timestamps', '1',
+            '-segment_list', 'pipe:1',
+            '-segment_list_type', 'csv',
+            str(out_pattern)
+        ]
+
+    def _write_chunk_frame(self, proc, frame):
+        """Write one frame to an encoder's stdin. Returns False if the pipe is gone.
+
+        The frame's buffer is written directly; ring slots are C-contiguous,
+        so no intermediate bytes copy is made.
+        """
+        try:
+            proc.stdin.write(memoryview(frame).cast('B'))
+            return True
+        except (BrokenPipeError, OSError):
+            self.logger.warning("Encoding pipe broken during write")
+            return False
 
-            return success
+    def _collect_chunks(self, proc, out_dir, started):
+        """Queue each chunk for upload as the segment muxer finishes it.
 
-        except subprocess.TimeoutExpired:
-            self.logger.error("Hardware encoding timeout (>10s)")
-            return False
+        Args:
+            proc: Segment encoder process whose stdout carries the chunk list
+            out_dir: Directory the chunks are written to
+            started: Wall-clock time the encoder was started
+        """
+        try:
+            for line in proc.stdout:
+                name, seg_start, seg_end = line.decode('utf-8', errors='ignore').strip().rsplit(',', 2)
+                chunk_path = out_dir / Path(name).name
+                if not chunk_path.exists():
+                    continue
+                chunk_id = chunk_path.stem[len(self.stream_id) + 1:]
+                ts_start = int(started + float(seg_start))
+                ts_end = int(started + float(seg_end))
+                self.logger.info(f"Chunk saved: {chunk_path}")
+                # Upload to cloud
+                self._upload_chunk_to_cloud(chunk_path, chunk_id, ts_start, ts_end)
         except Exception as e:
-            self.logger.error(f"Hardware encoding error: {e}")
-            return False
+            self.logger.error(f"Chunk collection error: {e}")
 
-    def _encode_chunk_software(self, frames, out_path, fps):
-        """Optimized software encoding using ffmpeg libx264."""
+    def _finish_chunk_encoder(self, proc, hardware, timeout=15):
+        """Close the encoder's stdin and wait for the last chunk to be finalized."""
+        label = 'Hardware' if hardware else 'Software'
         try:
-            import cv2
-            if not frames:
-                return False
-
-            h, w = frames[0].shape[:2]
-
-            # Get encoding preset from config (default: ultrafast for low CPU)
-            preset = self.config.get('encoding_preset', 'ultrafast')
-            crf = self.config.get('encoding_crf', 28)  # Quality: 18-28 (higher=smaller file, lower quality)
-
-            # Use ffmpeg with optimized libx264 settings
-            cmd = [
-                'ffmpeg',
-                '-y',
-                '-f', 'rawvideo',
-                '-vcodec', 'rawvideo',
-                '-pix_fmt', 'bgr24',
-                '-s', f'{w}x{h}',
-                '-r', str(fps),
-                '-i', '-',
-                '-c:v', 'libx264',
-                '-preset', preset,  # ultrafast = lowest CPU, fast encode
-                '-tune', 'zerolatency',  # Optimize for real-time encoding
-                '-crf', str(crf),  # Constant quality mode
-                '-pix_fmt', 'yuv420p',
-                '-movflags', '+faststart',  # Enable streaming playback
-                str(out_path)
-            ]
-
-            self.logger.info(f"Software encoding (libx264): {w}x{h} @ {fps}fps, preset={preset}, crf={crf}")
-            proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-            # Write frames to ffmpeg stdin
-            for frame in frames:
+            if proc.stdin is not None:
                 try:
-                    proc.stdin.write(frame.tobytes())
-                except BrokenPipeError:
-                    self.logger.warning("Software encoding pipe broken during write")
-                    break
-
-            proc.stdin.close()
-            _, stderr = proc.communicate(timeout=15)
-
-            success = proc.returncode == 0 and out_path.exists()
-
-            if success:
-                self.logger.info(f"✓ Software encoding succeeded: {out_path.name}")
+                    proc.stdin.close()
+                except (BrokenPipeError, OSError):
+                    pass
             else:
-                self.logger.warning(f"✗ Software encoding failed (returncode={proc.returncode})")
-                if stderr:
-                    error_msg = stderr.decode('utf-8', errors='ignore')[:500]
-                    self.logger.debug(f"FFmpeg stderr: {error_msg}")
-
-            return success
+                # Stream-copy recorder: ffmpeg exits with 255 after a clean SIGTERM
+                label = 'Stream copy'
+                proc.terminate()
+            proc.wait(timeout=timeout)
+
+            if proc.returncode == 0 or (proc.stdin is None and proc.returncode == 255):
+                self.logger.info(f"✓ {label} encoding finished")
+                return True
+
+            self.logger.warning(f"✗ {label} encoding failed (returncode={proc.returncode})")
+            stderr = proc.stderr.read()
+            if stderr:
+                # Log first 500 chars of error for debugging
+                error_msg = stderr.decode('utf-8', errors='ignore')[:500]
+                self.logger.debug(f"FFmpeg stderr: {error_msg}")
+            if hardware:
+                # Use the software encoder for subsequent motion episodes
+                self._hw_chunk_encode_failed = True
+            return False
 
         except subprocess.TimeoutExpired:
-            self.logger.error("Software encoding timeout (>15s)")
+            self.logger.error(f"{label} encoding timeout (>{timeout}s)")
+            proc.kill()
             return False
         except Exception as e:
-            self.logger.error(f"Software encoding error: {e}")
+            self.logger.error(f"{label} encoding error: {e}")
             return False
 
     def _upload_chunk_to_cloud(self, chunk_path, chunk_id, ts_start, ts_end):
@@ -270,79 +583,223 @@ class Streamer:
             self.logger.error(f"Error queuing chunk for upload: {e}")
 
     def _setup_logger(self):
+        """Attach a non-blocking queue handler to this stream's logger.
+
+        Records are written to logs/<stream_id>.log by a single process-wide
+        QueueListener thread, so logging from the capture thread never waits
+        on disk I/O. Files rotate at 10 MB and share one formatter.
+        """
         log_dir = Path('logs')
         log_dir.mkdir(exist_ok=True)
         logger = logging.getLogger(f'streamer-{self.stream_id}')
         logger.setLevel(logging.INFO)
-        fh = logging.FileHandler(log_dir / f'{self.stream_id}.log')
-        fh.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
-        logger.addHandler(fh)
+        # Opened lazily by the listener thread on the first record
+        fh = RotatingFileHandler(log_dir / f'{self.stream_id}.log', maxBytes=10_000_000,
+                                 backupCount=3, delay=True)
+        fh.setFormatter(Streamer._log_formatter)
+        # Same lock as _close_logger's stop decision: this streamer is already
+        # registered, so a listener seen running here is not stopped under us
+        with Streamer._lock:
+            if Streamer._log_listener is None:
+                Streamer._log_router = _StreamLogRouter()
+                Streamer._log_listener = QueueListener(Streamer._log_queue, Streamer._log_router)
+                Streamer._log_listener.start()
+            record = logger.makeRecord(logger.name, logging.INFO, __file__, 0, "Log opened", None, None)
+            record.open_handler = fh
+            Streamer._log_queue.put(record)
+        if not any(isinstance(h, QueueHandler) for h in logger.handlers):
+            logger.addHandler(QueueHandler(Streamer._log_queue))
         return logger
 
+    def _open_event_log(self):
+        """Open this stream's append-only JSONL motion event log."""
+        log_dir = Path('logs')
+        log_dir.mkdir(exist_ok=True)
+        self._event_file = log_dir / f'events_{self.stream_id}.jsonl'
+        self._event_fh = open(self._event_file, 'a', encoding='utf-8', buffering=1)
+        if self._event_fh.tell():
+            with open(self._event_file, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    # Terminate a line torn by a crash so the next event starts clean
+                    self._event_fh.write('\n')
+        self._events_since_compact = 0
+
     def _log_motion_event(self, status, fps):
-        """Log motion event to JSON file for event tracking"""
+        """Append a motion event to the stream's JSONL event log.
+
+        One line is written per event, so the cost no longer grows with the
+        file. Every ``_event_compact_every`` events the file is cut back to the
+        last ``_event_keep`` lines.
+        """
         try:
-            log_dir = Path('logs')
-            log_dir.mkdir(exist_ok=True)
-            event_file = log_dir / f'events_{self.stream_id}.json'
-            
             event = {
                 'timestamp': datetime.now().isoformat(),
                 'status': status,
                 'fps': fps
             }
-            
-            # Load existing events
-            events = []
-            if event_file.exists():
-                try:
-                    with open(event_file, 'r') as f:
-                        events = json.load(f)
-                except:
-                    events = []
-            
-            # Append new event and keep last 100 events
-            events.append(event)
-            events = events[-100:]
-            
-            # Save back to file
-            with open(event_file, 'w') as f:
-                json.dump(events, f, indent=2)
+            self._event_fh.write(_EVENT_ENCODER.encode(event) + '\n')
+
+            self._events_since_compact += 1
+            if self._events_since_compact >= self._event_compact_every:
+                self._compact_event_log()
         except Exception as e:
             self.logger.error(f"Failed to log motion event: {e}")
 
-    def _get_target_bitrate(self):
-        if self._low_quality:
-            return self.low_bitrate
-        if not self.motion_active:
-            return self.low_bitrate
-        return self.default_bitrate
-
-    def _get_target_fps(self):
+    def _compact_event_log(self):
+        """Rewrite the event log with only its most recent lines."""
+        self._event_fh.close()
+        with open(self._event_file, 'r', encoding='utf-8') as f:
+            recent = deque(f, maxlen=self._event_keep)
+        tmp = self._event_file.with_suffix('.jsonl.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.writelines(recent)
+        os.replace(tmp, self._event_file)
+        self._event_fh = open(self._event_file, 'a', encoding='utf-8', buffering=1)
+        self._events_since_compact = 0
+
+    def _apply_config(self, config):
+        """Snapshot the settings read on the per-frame paths into attributes."""
+        self._motion_high_fps = int(config.get('motion_high_fps', 25))
+        self._motion_low_fps = int(config.get('motion_low_fps', 1))
+        # Rate frames are decoded for motion detection (capture restarts apply it to ffmpeg)
+        self._sample_fps = max(1, int(config.get('motion_sample_fps', 10)))
+        self._sample_interval = 1.0 / self._sample_fps
+        self._bitrate_min_hold = float(config.get('bitrate_min_hold_sec', 5))
+        self._bitrate_hysteresis = float(config.get('bitrate_hysteresis_sec', 3))
+        self._chunking_enabled = bool(config.get('chunking_enabled', False))
+        self._chunk_duration = int(config.get('chunk_duration', 5))
+        self._chunk_fps = int(config.get('chunk_fps', 2))
+        self._chunk_passthrough = bool(config.get('chunk_passthrough', False))
+        self._encoder = config.get('encoder', 'auto')
+        self._restream_passthrough = bool(config.get('restream_passthrough', False))
+        # Targets indexed by (not low_quality) << 1 | motion_active, and by motion_active
+        self._bitrate_lut = (self.low_bitrate,) * 3 + (self.default_bitrate,)
+        self._fps_lut = (self._motion_low_fps, self._motion_high_fps)
+
+    def _get_target_bitrate(self, motion=None):
+        # Full bitrate only with motion and outside low-quality mode
+        if motion is None:
+            motion = self.motion_active
+        return self._bitrate_lut[(not self._low_quality) << 1 | motion]
+
+    def _get_target_fps(self, motion=None):
         """Return target FPS based on motion state and config.
 
         Uses `motion_high_fps` and `motion_low_fps` values from config with
-        sensible defaults (25/1).
+        sensible defaults (25/1). `motion` defaults to the live motion_active.
         """
-        if self.motion_active:
-            return int(self.config.get('motion_high_fps', 25))
-        return int(self.config.get('motion_low_fps', 1))
+        if motion is None:
+            motion = self.motion_active
+        return self._fps_lut[motion]
 
     def _build_ffmpeg_command(self):
-        # Build ffmpeg command with dynamic FPS and bitrate
-        target_fps = self._get_target_fps()
-        target_bitrate = self._get_target_bitrate()
-        
+        # Build ffmpeg argv with dynamic FPS and bitrate. The list is passed
+        # straight to Popen (no shell), so the RTSP URL needs no quoting.
+        # The targets follow the smoothed state chosen by _process_motion;
+        # low-quality mode still applies immediately.
+        motion = bool(self._pipeline_motion)
+        if self._restream_passthrough and not self._low_quality and motion:
+            # Full quality is what the camera already sends: copy, no transcode
+            encoder = 'copy'
+        else:
+            encoder = self._restream_encoder()
+        key = (self.rtsp_url, self._get_target_fps(motion),
+               self._get_target_bitrate(motion), encoder)
+        argv = self._argv_cache.get(key)
+        if argv is None:
+            argv = self._argv_cache[key] = self._argv_for(*key)
+        return list(argv)
+
+    @staticmethod
+    def _argv_for(rtsp_url, target_fps, target_bitrate, encoder):
+        """Restream argv for one (url, fps, bitrate, encoder) combination.
+
+        Motion transitions flip between a few fixed targets, so
+        _build_ffmpeg_command keeps the result per streamer in _argv_cache
+        and reuses it on every restart.
+        """
+        # The input is a live RTSP source, so it is not throttled with -re.
+        codec_args = _ENCODER_ARGS.get(encoder, _ENCODER_ARGS['libx264'])
+        hwaccel_args = _ENCODER_INPUT_ARGS.get(encoder, ())
+        input_args = (
+            'ffmpeg',
+            '-hide_banner', '-nostats',  # keep stderr to warnings and errors
+            '-rtsp_transport', 'tcp',
+        ) + tuple(_LOW_DELAY_INPUT_ARGS)
+
+        if encoder == 'copy':
+            # Remux the camera's H.264 as is; fps and bitrate are the camera's
+            return input_args + (
+                '-i', rtsp_url,
+                '-map', '0:v', '-c:v', 'copy',
+            ) + _TS_OUTPUT_ARGS
+
         # Output to local file or pipe (no SRT)
-        cmd = (
-            f"ffmpeg -re -rtsp_transport tcp -i {shlex.quote(self.rtsp_url)} "
-            f"-r {target_fps} -c:v libx264 -preset ultrafast -b:v {target_bitrate} "
-            f"-maxrate {target_bitrate} -bufsize {target_bitrate * 2} "
-            f"-g {target_fps * 2} -f mpegts pipe:1"
-        )
-        return shlex.split(cmd)
+        return input_args + hwaccel_args + (
+            '-i', rtsp_url,
+            '-r', str(target_fps),
+        ) + codec_args + (
+            '-b:v', str(target_bitrate),
+            '-maxrate', str(target_bitrate),
+            '-bufsize', str(target_bitrate * 2),
+            '-g', str(target_fps * 2),
+        ) + _TS_OUTPUT_ARGS
+
+    def _restream_encoder(self):
+        """Return the restream encoder: the `encoder` config key, or detected.
+
+        With `encoder: auto` (the default) the first encoder from
+        _HW_ENCODERS that ffmpeg lists and whose device exists is used, else
+        libx264. Generic ffmpeg builds list hardware encoders without the
+        hardware behind them, hence the device check. ffmpeg is probed once
+        and the answer is shared by all streamers.
+        """
+        if self._encoder != 'auto':
+            return self._encoder
+        cls = type(self)
+        if cls._hw_encoder is None:
+            out = cls._probe_ffmpeg('-encoders')
+            if out is None:
+                # Do not cache; ffmpeg may be installed later
+                return 'libx264'
+            cls._hw_encoder = next((name for name, device in _HW_ENCODERS
+                                    if f' {name} ' in out and os.path.exists(device)), 'libx264')
+        return cls._hw_encoder
+
+    @classmethod
+    def _capture_decoder(cls):
+        """Return the hardware H.264 decoder for capture, or '' for software decode.
+
+        The first decoder from _HW_DECODERS that ffmpeg lists and whose
+        device exists is used; ffmpeg is probed once for all streamers.
+        """
+        if cls._hw_decoder is None:
+            out = cls._probe_ffmpeg('-decoders')
+            if out is None:
+                return ''
+            cls._hw_decoder = next((name for name, device in _HW_DECODERS
+                                    if f' {name} ' in out and os.path.exists(device)), '')
+        return cls._hw_decoder
+
+    @classmethod
+    def _probe_ffmpeg(cls, flag):
+        """Return the output of `ffmpeg <flag>` (e.g. -encoders), or None if it fails."""
+        try:
+            # Only the listing on stdout is read; the banner and any log
+            # output are not captured
+            result = subprocess.run([cls._ffmpeg_path or 'ffmpeg', '-hide_banner', flag],
+                                    stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                    stderr=subprocess.DEVNULL, timeout=10)
+            return result.stdout.decode('utf-8', errors='ignore')
+        except Exception:
+            return None
 
     def _start_ffmpeg(self):
+        # Called under _pipeline_lock; stop() terminates under the same lock,
+        # so nothing is spawned once it has run
+        if not self.running:
+            return
         # Ensure ffmpeg is available before attempting to start
         if not Streamer._ffmpeg_path:
             # warn once per-instance to avoid log spam
@@ -350,57 +807,227 @@ class Streamer:
                 print("Failed to start ffmpeg pipeline: ffmpeg not found on PATH."
                       " Please install ffmpeg (e.g. Chocolatey on Windows) and ensure it's available in your PATH.")
                 self._ffmpeg_warned = True
-            # Do not attempt to start; watcher thread will start pipeline when ffmpeg appears
+            # Do not attempt to start; the shared watcher starts pipelines when ffmpeg appears
             self.proc = None
             return
 
         args = self._build_ffmpeg_command()
         try:
-            self.proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            # Nothing reads stdout, so it goes to /dev/null instead of a pipe
+            # that fills up; stderr is drained by the shared stderr thread
+            # (see _watch_stderr). Python opens files
+            # non-inheritable (PEP 446), so close_fds=False leaks nothing.
+            # With that and an executable path that has a directory, Popen
+            # uses posix_spawn instead of fork/exec.
+            self.proc = subprocess.Popen(args, executable=os.path.abspath(Streamer._ffmpeg_path),
+                                         stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                         close_fds=False)
+            self._last_argv = tuple(args)
+            self._ffmpeg_stderr_tail = deque(maxlen=20)
+            self._watch_stderr(self.proc, self._ffmpeg_stderr_tail)
         except Exception as e:
             print(f"Failed to start ffmpeg pipeline: {e}")
             self.proc = None
 
-    def _ffmpeg_watcher(self):
-        """Background watcher: poll for ffmpeg on PATH and start pipeline when found.
+    def _watch_stderr(self, proc, tail):
+        """Drain ffmpeg's stderr until it exits, keeping the last lines in `tail`.
 
-        This avoids repeated error spam at startup and allows admins to install
-        ffmpeg later without restarting the whole agent.
+        Draining keeps ffmpeg from blocking on a full pipe; the tail is logged
+        by _watch_pipeline if the pipeline dies. End of stderr means ffmpeg
+        exited, which wakes the pipeline thread (see _on_ffmpeg_exit). All
+        restreams share one selector thread rather than one reader thread each.
         """
-        # quick-return if ffmpeg already present
-        if Streamer._ffmpeg_path:
+        cls = type(self)
+        if os.name == 'nt':
+            # select() on Windows only handles sockets, not pipes
+            threading.Thread(target=self._drain_stderr, args=(proc, tail), daemon=True).start()
             return
+        with cls._lock:
+            if cls._stderr_selector is None:
+                cls._stderr_selector = selectors.DefaultSelector()
+                threading.Thread(target=cls._stderr_loop, daemon=True).start()
+        # partial last line is kept in the bytearray until its newline arrives
+        cls._stderr_selector.register(proc.stderr, selectors.EVENT_READ,
+                                      (tail, bytearray(), self, proc))
+
+    @classmethod
+    def _stderr_loop(cls):
+        """Shared stderr thread: read whichever ffmpeg pipes are ready.
+
+        Every restream depends on this one thread, so an error on one pipe
+        is logged and that pipe dropped; the loop keeps draining the rest.
+        """
+        sel = cls._stderr_selector
+        while True:
+            try:
+                ready = sel.select(timeout=1.0)
+            except Exception as e:
+                print(f"ffmpeg stderr selector error: {e}")
+                time.sleep(1.0)
+                continue
+            for key, _ in ready:
+                tail, partial, streamer, proc = key.data
+                try:
+                    try:
+                        data = os.read(key.fd, 65536)
+                    except OSError:
+                        data = b''
+                    if not data:
+                        # ffmpeg exited
+                        if partial:
+                            tail.append(partial.decode('utf-8', errors='ignore').rstrip())
+                        sel.unregister(key.fileobj)
+                        key.fileobj.close()
+                        streamer._on_ffmpeg_exit(proc)
+                        continue
+                    partial += data
+                    *lines, rest = partial.split(b'\n')
+                    for line in lines:
+                        tail.append(line.decode('utf-8', errors='ignore').rstrip())
+                    partial[:] = rest
+                except Exception as e:
+                    streamer.logger.error(f"Failed to drain ffmpeg stderr: {e}")
+                    # Closing the pipe makes ffmpeg exit on its next write
+                    # (rather than block), and the pipeline thread restarts it
+                    try:
+                        sel.unregister(key.fileobj)
+                    except Exception:
+                        pass
+                    try:
+                        key.fileobj.close()
+                    except Exception:
+                        pass
+                    streamer._on_ffmpeg_exit(proc)
+
+    def _drain_stderr(self, proc, tail):
+        """Blocking per-process fallback for _watch_stderr."""
+        try:
+            for line in proc.stderr:
+                tail.append(line.decode('utf-8', errors='ignore').rstrip())
+        except Exception:
+            pass
+        proc.stderr.close()
+        self._on_ffmpeg_exit(proc)
+
+    def _on_ffmpeg_exit(self, proc):
+        """Wake the pipeline thread if the current restream just exited."""
+        if getattr(self, 'proc', None) is proc:
+            self._restart_event.set()
+
+    @classmethod
+    def _start_ffmpeg_watcher(cls):
+        """Start the shared ffmpeg watcher thread unless one is already running."""
+        with cls._lock:
+            if cls._watcher_running:
+                return
+            cls._watcher_running = True
+        threading.Thread(target=cls._ffmpeg_watcher, daemon=True).start()
+
+    @classmethod
+    def _ffmpeg_watcher(cls):
+        """Background watcher: poll for ffmpeg on PATH and start pipelines when found.
+
+        A single watcher serves all streamers. It polls every 5s for the
+        first minute and every 30s after that, which avoids repeated error
+        spam at startup and allows admins to install ffmpeg later without
+        restarting the whole agent. Pipelines are started by each streamer's
+        own pipeline thread, which serializes them with its other restarts.
+        """
+        started = time.monotonic()
         try:
-            while self.running and not Streamer._ffmpeg_path:
+            while not cls._ffmpeg_path:
                 path = shutil.which('ffmpeg')
                 if path:
-                    Streamer._ffmpeg_path = path
-                    print(f"ffmpeg detected at {path}; starting pipeline for stream {self.stream_id}")
-                    # reset warning flag now that ffmpeg is available
-                    self._ffmpeg_warned = False
-                    # start the pipeline
-                    self._start_ffmpeg()
+                    cls._ffmpeg_path = path
+                    print(f"ffmpeg detected at {path}; starting pipelines")
+                    with cls._lock:
+                        instances = list(cls._instances)
+                    for inst in instances:
+                        if inst.running:
+                            # reset warning flag now that ffmpeg is available
+                            inst._ffmpeg_warned = False
+                            inst._restart_event.set()
                     break
-                time.sleep(5)
+                time.sleep(5 if time.monotonic() - started < 60 else 30)
         except Exception:
             # watcher should never crash the program
             pass
+        finally:
+            with cls._lock:
+                cls._watcher_running = False
 
     def _restart_pipeline(self):
-        try:
-            if hasattr(self, 'proc') and self.proc:
-                self.proc.terminate()
-                try:
-                    self.proc.wait(timeout=3)
-                except Exception:
-                    self.proc.kill()
-        except Exception:
-            pass
-        self._start_ffmpeg()
+        with self._pipeline_lock:
+            if not self.running:
+                # stop() has terminated (or is about to terminate) the pipeline
+                return
+            proc = getattr(self, 'proc', None)
+            if (proc is not None and proc.poll() is None
+                    and tuple(self._build_ffmpeg_command()) == self._last_argv):
+                # Same argv as the running pipeline; a restart would only drop video
+                return
+            try:
+                if hasattr(self, 'proc') and self.proc:
+                    self.proc.terminate()
+                    try:
+                        self.proc.wait(timeout=3)
+                    except Exception:
+                        self.proc.kill()
+            except Exception:
+                pass
+            self._start_ffmpeg()
+
+    def _watch_pipeline(self):
+        """Pipeline thread: run requested restarts and revive a dead restream.
+
+        Restarts requested through _restart_event (set_low_quality,
+        restart_all) run here, so each streamer restarts on its own thread.
+        A pipeline that died on its own (camera dropped, network error) is
+        restarted too: the stderr drain signals the exit, so the first
+        restart is immediate, then restarts back off from 5s to 60s while
+        ffmpeg keeps exiting.
+        """
+        delay = 5
+        revive_at = 0.0
+        while self.running:
+            proc = getattr(self, 'proc', None)
+            # The stderr drain closes the pipe at EOF, which can be just
+            # before the exited ffmpeg is reaped
+            dead = proc is not None and (proc.poll() is not None or proc.stderr.closed)
+            now = time.monotonic()
+            if dead and now >= revive_at:
+                with self._pipeline_lock:
+                    if self.running and self.proc is proc:
+                        try:
+                            proc.wait(timeout=5)
+                        except subprocess.TimeoutExpired:
+                            proc.kill()
+                            proc.wait()
+                        self.logger.warning(f"ffmpeg pipeline exited (code {proc.returncode}); restarting")
+                        for line in self._ffmpeg_stderr_tail:
+                            self.logger.warning(f"ffmpeg: {line}")
+                        self._start_ffmpeg()
+                revive_at = now + delay
+                delay = min(60, delay * 2)
+                continue
+            if not dead and now >= revive_at:
+                # ffmpeg outlived the backoff window
+                delay = 5
+            # Woken by restart requests and by ffmpeg exiting; the timeout
+            # is the backoff while dead and a fallback check otherwise
+            if self._restart_event.wait(revive_at - now if dead else 5):
+                self._restart_event.clear()
+                proc = getattr(self, 'proc', None)
+                if self.running and (proc is None or (proc.poll() is None and not proc.stderr.closed)):
+                    try:
+                        self._restart_pipeline()
+                    except Exception as e:
+                        self.logger.error(f"Pipeline restart failed: {e}")
 
     def update_config(self, config):
         """Update streamer configuration and motion detector settings."""
         self.config = config
+        self._apply_config(config)
         try:
             self.detector.update_settings(
                 sensitivity=config.get('motion_sensitivity'),
@@ -411,6 +1038,8 @@ class Streamer:
         except Exception:
             # If detector doesn't support update_settings, ignore
             pass
+        # Start the chunking thread if chunking was just enabled
+        self._sync_chunking_thread()
         # Restart pipeline to pick up bitrate/resolution changes
         try:
             self._restart_pipeline()
@@ -422,44 +1051,75 @@ class Streamer:
         # mark as not running so threads exit
         self.running = False
 
-        # terminate ffmpeg process if running
-        try:
-            if hasattr(self, 'proc') and self.proc:
-                try:
-                    self.proc.terminate()
-                    self.proc.wait(timeout=3)
-                except Exception:
+        # terminate ffmpeg process if running; the lock waits out a restart
+        # in progress, and later restarts see running=False
+        with self._pipeline_lock:
+            try:
+                if hasattr(self, 'proc') and self.proc:
                     try:
-                        self.proc.kill()
+                        self.proc.terminate()
+                        self.proc.wait(timeout=3)
                     except Exception:
-                        pass
-        except Exception:
-            pass
+                        try:
+                            self.proc.kill()
+                        except Exception:
+                            pass
+            except Exception:
+                pass
+
+        # remove from instances set
+        with Streamer._lock:
+            Streamer._instances.discard(self)
+        # wake the pipeline thread so it sees running=False
+        self._restart_event.set()
 
-        # remove from instances list
         try:
-            if self in self._instances:
-                self._instances.remove(self)
+            self._event_fh.close()
         except Exception:
             pass
 
+        self._close_logger()
+
+    def _close_logger(self):
+        """Flush, fsync and close this streamer's log file.
+
+        The close request travels through the log queue, so every record
+        logged before it is written first. Log records stay block-buffered
+        during the run; the single fsync at close makes the log durable at
+        shutdown without a per-line sync cost. The shared listener is stopped
+        once the last streamer is gone.
+        """
+        record = self.logger.makeRecord(self.logger.name, logging.INFO, __file__, 0,
+                                        "Log closed", None, None)
+        record.close_stream = True
+        Streamer._log_queue.put(record)
+        with Streamer._lock:
+            if not self._instances and Streamer._log_listener is not None:
+                Streamer._log_listener.stop()
+                Streamer._log_listener = None
+                Streamer._log_router = None
+
     def _capture_loop(self):
         # lightweight capture loop used for motion detection
-        import cv2
-        import numpy as np
-
         use_hw_decode = self.config.get('use_hardware_decode', True)
 
         if use_hw_decode:
             self.logger.info(f"Starting capture loop with hardware decoding for {self.rtsp_url}")
             success = self._capture_loop_hw_decode()
+            # Restart the decoder when chunking starts or stops needing color
+            while success and self.running and self._capture_gray != self._gray_capture_ok():
+                success = self._capture_loop_hw_decode()
             if success:
                 return
             self.logger.warning("Hardware decode failed, falling back to OpenCV")
 
         # Fallback to OpenCV software decoding
+        self._capture_prescaled = False
         self.logger.info(f"Starting capture loop (software decode) for {self.rtsp_url}")
-        cap = cv2.VideoCapture(self.rtsp_url)
+        # Read by OpenCV's ffmpeg backend when the capture opens; an
+        # operator-provided value takes precedence
+        os.environ.setdefault('OPENCV_FFMPEG_CAPTURE_OPTIONS', _LOW_DELAY_CAPTURE_OPTIONS)
+        cap = cv2.VideoCapture(self.rtsp_url, cv2.CAP_FFMPEG)
         if not cap.isOpened():
             self.logger.error(f"Failed to open RTSP stream: {self.rtsp_url}")
             return
@@ -469,13 +1129,45 @@ class Streamer:
 
         self.logger.info("RTSP stream opened successfully")
         frame_count = 0
-        last_frame_time = time.time()
-        target_interval = 0.1  # 10 FPS
-
+        last_frame_time = 0.0
+        ring, slot = None, None
+        gray = False
+        gray_supported = True
+
+        # grab() blocks at the camera's frame rate and keeps the capture
+        # buffer drained; only frames due at motion_sample_fps are retrieved
+        # (converted to BGR unless gray is enough), so no sleep is needed and
+        # detection never sees stale frames
         while self.running:
-            ret, frame = cap.read()
+            ret = cap.grab()
+            if ret:
+                now = time.time()
+                if now - last_frame_time < self._sample_interval:
+                    continue
+                last_frame_time = now
+                if gray != (gray_supported and self._gray_capture_ok()):
+                    # Skip the BGR conversion when chunking needs no color:
+                    # the ffmpeg backend then returns the raw luma plane
+                    gray = not gray
+                    cap.set(cv2.CAP_PROP_CONVERT_RGB, 0 if gray else 1)
+                # OpenCV warns on every gray retrieve that the pixel format
+                # "will be treated as 8UC1" (i.e. the luma plane, as wanted)
+                with self._quiet_opencv() if gray else nullcontext():
+                    if ring is None:
+                        ret, frame = cap.retrieve()
+                    else:
+                        # Convert straight into the current ring slot (no allocation)
+                        ret, frame = cap.retrieve(ring.frames[slot])
+                if ret and gray and frame.ndim == 3:
+                    # This backend ignores CONVERT_RGB and still returns BGR,
+                    # which the detector accepts; stop asking for gray
+                    self.logger.info("Capture backend has no gray output, keeping BGR frames")
+                    gray_supported = gray = False
+                    cap.set(cv2.CAP_PROP_CONVERT_RGB, 1)
             if not ret:
                 self.logger.warning("Failed to read frame, retrying...")
+                # No frames means no motion evidence
+                self.motion_active = False
                 time.sleep(0.5)
                 continue
 
@@ -483,60 +1175,72 @@ class Streamer:
             if frame_count % 100 == 0:  # Log every 100 frames
                 self.logger.info(f"Captured {frame_count} frames")
 
-            try:
-                if not self.frame_queue.full():
-                    self.frame_queue.put(frame, block=False)
-            except Exception:
-                pass
+            if ring is None or frame.shape != ring.shape:
+                # First frame or resolution change: (re)allocate the slots
+                ring = FrameRing(frame.shape, self._frame_ring_size)
+                slot = ring.acquire()
+                ring.frames[slot] = frame
 
-            # Dynamic sleep to maintain target FPS without wasting CPU
-            elapsed = time.time() - last_frame_time
-            sleep_time = max(0, target_interval - elapsed)
-            if sleep_time > 0:
-                time.sleep(sleep_time)
-            last_frame_time = time.time()
+            slot = self._handle_frame(ring, slot)
 
         cap.release()
+        self.motion_active = False
         self.logger.info("Capture loop ended")
 
     def _capture_loop_hw_decode(self):
-        """Hardware-accelerated RTSP capture using ffmpeg for decoding."""
-        import cv2
-        import numpy as np
-
+        """Hardware-accelerated RTSP capture using ffmpeg for decoding.
+
+        When chunking does not need color frames, ffmpeg outputs the luma
+        plane only (gray), already downscaled to the detector's
+        detection_scale, which is all motion detection uses. The loop ends
+        once that requirement changes.
+        Decoding runs on a hardware H.264 decoder when one is available (see
+        _capture_decoder); if it yields no frames, software decode is used.
+        """
         try:
+            self._capture_gray = gray = self._gray_capture_ok()
+            decoder = '' if self._hw_decoder_failed else self._capture_decoder()
+            decoder_args = ['-c:v', decoder] if decoder else []
+            scale = self.detector.detection_scale if gray else 1
+            vf = f'fps={self._sample_fps}'  # Limit to motion_sample_fps
+            if scale != 1:
+                # trunc() matches the detector's int() sizing
+                vf += f',scale=trunc(iw*{scale}):trunc(ih*{scale})'
             # FFmpeg command with hardware decoding
             cmd = [
                 'ffmpeg',
                 '-rtsp_transport', 'tcp',
+            ] + _LOW_DELAY_INPUT_ARGS + decoder_args + [
                 '-i', self.rtsp_url,
-                '-vf', 'fps=10',  # Limit to 10 FPS
+                '-vf', vf,
                 '-f', 'rawvideo',
-                '-pix_fmt', 'bgr24',
+                '-pix_fmt', 'gray' if gray else 'bgr24',
                 'pipe:1'
             ]
 
-            self.logger.info("Starting hardware-accelerated decode pipeline")
+            self.logger.info(f"Starting hardware-accelerated decode pipeline ({decoder or 'software decoder'})")
             proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=10**8)
 
             # We need to know frame dimensions - try to get from first frame
             # Assume 1920x1080 initially, will auto-detect
             frame_count = 0
-            last_frame_time = time.time()
-            target_interval = 0.1
             width, height = None, None
+            # set if stderr shows the hardware decoder failing
+            decoder_error = False
 
             # Try to detect resolution from stderr output
-            import threading
             def read_stderr():
+                nonlocal width, height, decoder_error
                 for line in proc.stderr:
                     decoded = line.decode('utf-8', errors='ignore')
-                    if 'Stream #' in decoded and 'Video:' in decoded:
+                    if decoder and not decoder_error and _is_decoder_error(decoded, decoder):
+                        decoder_error = True
+                        self.logger.warning(f"ffmpeg: {decoded.rstrip()}")
+                    # The input stream is listed first; output lines follow
+                    if width is None and 'Stream #' in decoded and 'Video:' in decoded:
                         # Try to extract resolution
-                        import re
-                        match = re.search(r'(\d{3,4})x(\d{3,4})', decoded)
+                        match = _RESOLUTION_RE.search(decoded)
                         if match:
-                            nonlocal width, height
                             width, height = int(match.group(1)), int(match.group(2))
                             self.logger.info(f"Detected resolution: {width}x{height}")
 
@@ -550,35 +1254,29 @@ class Streamer:
                 # Default to common resolution
                 width, height = 1920, 1080
                 self.logger.warning(f"Could not detect resolution, using default {width}x{height}")
+            if scale != 1:
+                width, height = int(width * scale), int(height * scale)
+            self._capture_prescaled = scale != 1
 
-            frame_size = width * height * 3  # BGR24 = 3 bytes per pixel
+            shape = (height, width) if gray else (height, width, 3)  # BGR24 = 3 bytes per pixel
+            frame_size = width * height * (1 if gray else 3)
+            ring = FrameRing(shape, self._frame_ring_size)
+            slot = ring.acquire()
 
-            while self.running:
-                raw_frame = proc.stdout.read(frame_size)
+            while self.running and gray == self._gray_capture_ok():
+                # Read raw bytes straight into the current ring slot
+                n = proc.stdout.readinto(memoryview(ring.frames[slot]).cast('B'))
 
-                if len(raw_frame) != frame_size:
+                if n != frame_size:
                     self.logger.warning("Incomplete frame or stream ended")
                     break
 
-                # Convert raw bytes to numpy array
-                frame = np.frombuffer(raw_frame, dtype=np.uint8).reshape((height, width, 3))
-
                 frame_count += 1
                 if frame_count % 100 == 0:
                     self.logger.info(f"Captured {frame_count} frames (HW decode)")
 
-                try:
-                    if not self.frame_queue.full():
-                        self.frame_queue.put(frame, block=False)
-                except Exception:
-                    pass
-
-                # Dynamic sleep to maintain target FPS
-                elapsed = time.time() - last_frame_time
-                sleep_time = max(0, target_interval - elapsed)
-                if sleep_time > 0:
-                    time.sleep(sleep_time)
-                last_frame_time = time.time()
+                # ffmpeg's fps filter paces the pipe; readinto blocks until due
+                slot = self._handle_frame(ring, slot)
 
             proc.terminate()
             try:
@@ -586,6 +1284,16 @@ class Streamer:
             except:
                 proc.kill()
 
+            stderr_thread.join(timeout=1)
+            if decoder and frame_count == 0 and decoder_error and self.running:
+                # e.g. an H.265 camera or a busy decoder; retry in software.
+                # No frames without a decoder error (camera offline) keeps
+                # the hardware decoder for the next attempt.
+                self.logger.warning(f"{decoder} produced no frames, using software decode")
+                self._hw_decoder_failed = True
+                return self._capture_loop_hw_decode()
+
+            self.motion_active = False
             self.logger.info("Hardware decode capture loop ended")
             return True
 
@@ -597,64 +1305,145 @@ class Streamer:
                 pass
             return False
 
-    def _motion_loop(self):
-        last_bitrate = None
-        last_fps = None
-        last_motion_state = False
-        motion_frame_count = 0
-        no_motion_frame_count = 0
-        self.logger.info("Starting motion detection loop")
-        while self.running:
+    @classmethod
+    @contextmanager
+    def _quiet_opencv(cls):
+        """Hold OpenCV's log level at ERROR for the duration of the block.
+
+        The level is process-wide, so it is counted across capture threads:
+        the first thread in raises it and the last one out restores it.
+        """
+        with cls._cv_quiet_lock:
+            if cls._cv_quiet_count == 0:
+                cls._cv_saved_log_level = _cv_logging.setLogLevel(_CV_LOG_LEVEL_ERROR)
+            cls._cv_quiet_count += 1
+        try:
+            yield
+        finally:
+            with cls._cv_quiet_lock:
+                cls._cv_quiet_count -= 1
+                if cls._cv_quiet_count == 0:
+                    _cv_logging.setLogLevel(cls._cv_saved_log_level)
+
+    def _gray_capture_ok(self):
+        """Whether capture may decode gray frames (chunking needs no color frames)."""
+        return not self._chunking_enabled or self._chunk_passthrough
+
+    def _handle_frame(self, ring, slot):
+        """Run motion detection on a captured frame and hand it to chunking.
+
+        Called inline from the capture thread, so capture and detection share
+        one thread per streamer instead of shuffling frames between two.
+        The frame lives in ``ring.frames[slot]``; handing it to chunking
+        passes ownership of the slot, so returns the slot the capture loop
+        should decode the next frame into.
+        """
+        self._process_motion(ring.frames[slot])
+
+        # Only feed the chunking queue while a chunking thread is consuming it
+        if (self._chunking_thread is not None and not self._chunk_passthrough
+                and len(ring.shape) == 3):
+            if len(self._ready_frames) >= self._max_ready_frames:
+                # Chunking is behind: drop the oldest published frame, not this one
+                try:
+                    old_ring, old_slot = self._ready_frames.popleft()
+                except IndexError:
+                    pass  # consumer took it meanwhile
+                else:
+                    old_ring.release(old_slot)
             try:
-                frame = self.frame_queue.get(timeout=1)
-            except queue.Empty:
-                self.motion_active = False
-                # self.logger.debug("No frames in queue, motion inactive")
-                time.sleep(0.5)
-                continue
-            
-            # Get raw motion detection result (before cooldown)
-            motion = self.detector.detect(frame)
-            
-            # Track motion stats for debugging
-            if motion:
-                motion_frame_count += 1
-                no_motion_frame_count = 0
-            else:
-                no_motion_frame_count += 1
-                motion_frame_count = 0
-            
-            # Log when motion starts/stops being detected (not cooldown)
-            if motion_frame_count == 1:
-                self.logger.info("Motion STARTED being detected")
-            elif no_motion_frame_count == 1:
-                self.logger.info("Motion STOPPED being detected (cooldown may still be active)")
-            
-            # Only trigger pipeline restart when motion state actually changes
-            if motion != last_motion_state:
-                self.motion_active = motion
-                target_bitrate = self._get_target_bitrate()
-                target_fps = self._get_target_fps()
-                
-                if last_bitrate is None:
-                    last_bitrate = target_bitrate
-                    last_fps = target_fps
-                    # Initial state - start pipeline
-                    self.logger.info(f"Initial state: Motion={motion}, FPS {target_fps}, Bitrate {target_bitrate}")
-                    self._log_motion_event("MOTION" if motion else "IDLE", target_fps)
-                    self._restart_pipeline()
-                elif target_bitrate != last_bitrate or target_fps != last_fps:
-                    status = "Motion ACTIVE (high FPS)" if motion else "Motion INACTIVE (low FPS)"
-                    self.logger.info(f"{status}: FPS {last_fps}->{target_fps}, Bitrate {last_bitrate}->{target_bitrate}; restarting pipeline")
-                    self._log_motion_event("MOTION" if motion else "IDLE", target_fps)
-                    self._restart_pipeline()
-                    last_bitrate = target_bitrate
-                    last_fps = target_fps
-                
-                last_motion_state = motion
-            
-            time.sleep(0.05)
-        self.logger.info("Motion detection loop ended")
+                next_slot = ring.acquire()
+            except IndexError:
+                # Consumer still holds every spare slot; reuse ours
+                return slot
+            self._ready_frames.append((ring, slot))
+            self._frame_ready.set()
+            return next_slot
+        return slot
+
+    def _process_motion(self, frame):
+        # Get raw motion detection result (before cooldown)
+        motion = self.detector.detect(frame, prescaled=self._capture_prescaled)
+
+        # Track motion stats for debugging
+        if motion:
+            self._motion_frame_count += 1
+            self._no_motion_frame_count = 0
+        else:
+            self._no_motion_frame_count += 1
+            self._motion_frame_count = 0
+
+        # Log when motion starts/stops being detected (not cooldown)
+        if self._motion_frame_count == 1:
+            self._log_transition("Motion STARTED being detected")
+        elif self._no_motion_frame_count == 1:
+            self._log_transition("Motion STOPPED being detected (cooldown may still be active)")
+        elif self._suppressed_transitions and int(time.monotonic() // 5) != self._transition_bucket:
+            self._flush_suppressed_transitions()
+
+        self.motion_active = motion
+
+        if self._pipeline_motion is None:
+            # Pipeline starts on the first motion state change
+            if not motion:
+                return
+            target_bitrate = self._get_target_bitrate(True)
+            target_fps = self._get_target_fps(True)
+            self._pipeline_motion = True
+            self._last_switch_ts = time.monotonic()
+            # Initial state - start pipeline
+            self.logger.info(f"Initial state: Motion={motion}, FPS {target_fps}, Bitrate {target_bitrate}")
+            self._log_motion_event("MOTION", target_fps)
+            self._restart_event.set()
+            return
+
+        # Smooth the motion state over a sliding window, require a new state
+        # to stay stable for the hysteresis time, and hold each setting for a
+        # minimum time, so flickering motion does not restart ffmpeg per sample
+        self._target_window.append(motion)
+        target = Counter(self._target_window).most_common(1)[0][0]
+        now = time.monotonic()
+        if target != self._pending_target:
+            self._pending_target = target
+            self._pending_since = now
+        if target == self._pipeline_motion:
+            return
+        if now - self._pending_since < self._bitrate_hysteresis:
+            return
+        if now - self._last_switch_ts < self._bitrate_min_hold:
+            return
+
+        target_bitrate = self._get_target_bitrate(target)
+        target_fps = self._get_target_fps(target)
+        status = "Motion ACTIVE (high FPS)" if target else "Motion INACTIVE (low FPS)"
+        self.logger.info(f"{status}: FPS {self._get_target_fps(self._pipeline_motion)}->{target_fps}, "
+                         f"Bitrate {self._get_target_bitrate(self._pipeline_motion)}->{target_bitrate}; "
+                         "restarting pipeline")
+        self._log_motion_event("MOTION" if target else "IDLE", target_fps)
+        # The pipeline thread builds the argv from _pipeline_motion, so set it
+        # before waking it; restarts coalesce with set_low_quality requests
+        self._pipeline_motion = target
+        self._last_switch_ts = now
+        self._restart_event.set()
+
+    def _log_transition(self, message):
+        """Log a motion transition, keeping only the first per 5-second window.
+
+        Flickering detections can toggle many times per second; the rest of
+        the window is counted and reported as a single summary line.
+        """
+        bucket = int(time.monotonic() // 5)
+        if bucket == self._transition_bucket:
+            self._suppressed_transitions += 1
+            return
+        self._flush_suppressed_transitions()
+        self._transition_bucket = bucket
+        self.logger.info(message)
+
+    def _flush_suppressed_transitions(self):
+        if self._suppressed_transitions:
+            self.logger.info(f"{self._suppressed_transitions} motion transitions suppressed")
+            self._suppressed_transitions = 0
 
     @classmethod
     def set_low_quality(cls, enabled: bool):
@@ -665,14 +1454,42 @@ class Streamer:
         """
         with cls._lock:
             cls._low_quality = enabled
-            for inst in list(cls._instances):
-                try:
-                    inst._restart_pipeline()
-                except Exception:
-                    # Individual restart failures should not block others
-                    pass
+            instances = list(cls._instances)
+        for inst in instances:
+            inst._restart_event.set()
 
     @classmethod
     def restart_all(cls):
-        for inst in list(cls._instances):
-            inst._restart_pipeline()
+        """Ask every streamer to restart its pipeline.
+
+        Each restart runs on the streamer's own pipeline thread (see
+        _watch_pipeline), so they proceed concurrently and this returns
+        immediately.
+        """
+        with cls._lock:
+            instances = list(cls._instances)
+        for inst in instances:
+            inst._restart_event.set()
+
+
+def read_recent_events(event_file, n=100):
+    """Return the last `n` events of a stream's JSONL event log.
+
+    Only the tail of the file is kept in memory. Lines torn by a crash are
+    skipped.
+
+    Args:
+        event_file: Path of an ``events_<id>.jsonl`` file
+        n: Maximum number of events to return
+
+    Returns:
+        List of event dicts, oldest first
+    """
+    events = []
+    with open(event_file, 'r', encoding='utf-8') as f:
+        for line in deque(f, maxlen=n):
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                pass
+    return events
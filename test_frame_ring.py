@@ -0,0 +1,51 @@
+"""
+Unit tests for FrameRing slot reuse
+"""
+
+import unittest
+
+import numpy as np
+
+from frame_ring import FrameRing
+
+
+class TestFrameRing(unittest.TestCase):
+
+    def setUp(self):
+        self.ring = FrameRing((4, 6, 3), 3)
+
+    def test_slots_are_preallocated(self):
+        self.assertEqual(self.ring.frames.shape, (3, 4, 6, 3))
+        self.assertEqual(self.ring.frames.dtype, np.uint8)
+
+    def test_acquire_exhausts_then_raises(self):
+        slots = [self.ring.acquire() for _ in range(3)]
+        self.assertEqual(sorted(slots), [0, 1, 2])
+        with self.assertRaises(IndexError):
+            self.ring.acquire()
+
+    def test_released_slot_is_reused(self):
+        slots = [self.ring.acquire() for _ in range(3)]
+        self.ring.release(slots[1])
+        self.assertEqual(self.ring.acquire(), slots[1])
+
+    def test_reuse_keeps_the_same_buffer(self):
+        frames = self.ring.frames
+        slot = [self.ring.acquire() for _ in range(3)][0]
+        view = self.ring.frames[slot]
+        view[:] = 7
+        self.ring.release(slot)
+        self.assertEqual(self.ring.acquire(), slot)
+        self.assertIs(self.ring.frames, frames)
+        self.assertTrue(np.shares_memory(self.ring.frames[slot], view))
+        self.assertTrue((self.ring.frames[slot] == 7).all())
+
+    def test_release_order_is_fifo(self):
+        slots = [self.ring.acquire() for _ in range(3)]
+        for slot in reversed(slots):
+            self.ring.release(slot)
+        self.assertEqual([self.ring.acquire() for _ in range(3)], list(reversed(slots)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+"""
+Unit tests for MotionDetector zone masking
+"""
+
+import unittest
+
+import numpy as np
+
+from motion_detector import MotionDetector
+
+
+class TestZoneMask(unittest.TestCase):
+
+    def setUp(self):
+        # Left half of a 80x60 frame; scale 0.5 gives a 40x30 detection size
+        self.detector = MotionDetector(min_area=16, zones=[(0, 0, 40, 60)], cooldown=0,
+                                       detection_scale=0.5, frame_skip=1)
+        self.builds = 0
+        build = self.detector._build_zone_mask
+
+        def counting_build(shape):
+            self.builds += 1
+            return build(shape)
+        self.detector._build_zone_mask = counting_build
+
+    def frame(self, x=None, size=(60, 80)):
+        """Black BGR frame with a white 20x20 square at column `x`."""
+        frame = np.zeros(size + (3,), dtype=np.uint8)
+        if x is not None:
+            frame[20:40, x:x + 20] = 255
+        return frame
+
+    def test_mask_built_once(self):
+        for _ in range(5):
+            self.detector.detect(self.frame())
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(self.detector._zone_mask.shape, (30, 40))
+        self.assertTrue((self.detector._zone_mask[:, :20] == 255).all())
+        self.assertFalse(self.detector._zone_mask[:, 20:].any())
+
+    def test_motion_outside_zone_is_ignored(self):
+        self.detector.detect(self.frame())
+        self.assertFalse(self.detector.detect(self.frame(x=55)))
+        self.detector.detect(self.frame())
+        self.assertTrue(self.detector.detect(self.frame(x=5)))
+
+    def test_zone_change_rebuilds_mask(self):
+        self.detector.detect(self.frame())
+        self.detector.detect(self.frame())
+        self.detector.update_settings(zones=[(40, 0, 40, 60)])
+        self.assertTrue(self.detector.detect(self.frame(x=55)))
+        self.assertEqual(self.builds, 2)
+
+    def test_scale_change_rebuilds_mask(self):
+        self.detector.detect(self.frame())
+        self.detector.detect(self.frame())
+        self.detector.update_settings(detection_scale=0.25)
+        self.detector.detect(self.frame())
+        self.detector.detect(self.frame())
+        self.assertEqual(self.builds, 2)
+        self.assertEqual(self.detector._zone_mask.shape, (15, 20))
+
+    def test_frame_size_change_rebuilds_mask(self):
+        self.detector.detect(self.frame())
+        self.detector.detect(self.frame())
+        self.detector.detect(self.frame(size=(120, 160)))
+        self.detector.detect(self.frame(size=(120, 160)))
+        self.assertEqual(self.builds, 2)
+        self.assertEqual(self.detector._zone_mask.shape, (60, 80))
+
+    def test_no_zones_no_mask(self):
+        self.detector.update_settings(zones=[])
+        self.detector.detect(self.frame())
+        self.detector.detect(self.frame(x=55))
+        self.assertEqual(self.builds, 0)
+        self.assertIsNone(self.detector._zone_mask)
+
+
+if __name__ == '__main__':
+    unittest.main()
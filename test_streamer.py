@@ -0,0 +1,330 @@
+"""
+Unit tests for Streamer motion smoothing, frame handoff, the event log and
+the restream argv
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from frame_ring import FrameRing
+from streamer import Streamer, read_recent_events, _cv_logging, _CV_LOG_LEVEL_ERROR, _is_decoder_error
+
+
+class StreamerTestCase(unittest.TestCase):
+    """Runs a Streamer in a temporary directory with no camera and no ffmpeg."""
+
+    config = {
+        'use_hardware_decode': False,
+        'encoder': 'libx264',
+        'motion_high_fps': 25,
+        'motion_low_fps': 1,
+        'bitrate_hysteresis_sec': 0,
+        'bitrate_min_hold_sec': 0,
+    }
+
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.mkdtemp()
+        # Streamer writes logs/ relative to the working directory
+        os.chdir(self._tmp)
+        self.streamer = Streamer(os.path.join(self._tmp, 'missing.mp4'), dict(self.config), 'test')
+        # Restarts are checked through the argv, not by running ffmpeg
+        self.streamer._start_ffmpeg = lambda: None
+
+    def tearDown(self):
+        self.streamer.stop()
+        os.chdir(self._cwd)
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+    def feed(self, *states):
+        """Run _process_motion with the detector reporting `states` in turn."""
+        for state in states:
+            self.streamer.detector.detect = lambda frame, prescaled=False, state=state: state
+            self.streamer._process_motion(None)
+
+    def argv_fps(self):
+        argv = self.streamer._build_ffmpeg_command()
+        return int(argv[argv.index('-r') + 1])
+
+
+class TestMotionSmoothing(StreamerTestCase):
+
+    def test_pipeline_starts_on_first_motion(self):
+        self.feed(False, False)
+        self.assertIsNone(self.streamer._pipeline_motion)
+        self.feed(True)
+        self.assertIs(self.streamer._pipeline_motion, True)
+        self.assertEqual(self.argv_fps(), 25)
+
+    def test_argv_follows_smoothed_state_not_live_state(self):
+        # Switch to idle once idle is the mode of the window
+        self.feed(True, *[False] * 10)
+        self.assertIs(self.streamer._pipeline_motion, False)
+        # A single motion sample does not change the window's mode, so the
+        # restream must stay at the idle target even though motion is live
+        self.feed(True)
+        self.assertTrue(self.streamer.motion_active)
+        self.assertEqual(self.argv_fps(), 1)
+
+    def test_pipeline_fps_holds_during_min_hold(self):
+        self.streamer._bitrate_min_hold = 60
+        self.feed(True, *[False] * 10)
+        # Idle is the window's mode, but the motion setting is still held
+        self.assertFalse(self.streamer.motion_active)
+        self.assertIs(self.streamer._pipeline_motion, True)
+        self.assertEqual(self.streamer.pipeline_fps, 25)
+        self.assertEqual(self.streamer.pipeline_fps, self.argv_fps())
+        self.assertEqual(self.streamer._get_target_fps(), 1)
+
+    def test_low_quality_applies_without_motion_change(self):
+        self.feed(True)
+        full = self.streamer._get_target_bitrate(True)
+        with patch.object(Streamer, '_low_quality', True):
+            argv = self.streamer._build_ffmpeg_command()
+        self.assertEqual(int(argv[argv.index('-b:v') + 1]), self.streamer.low_bitrate)
+        self.assertNotEqual(full, self.streamer.low_bitrate)
+
+
+class TestFrameHandoff(StreamerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.streamer._process_motion = lambda frame: None
+        # Pretend a chunking thread is consuming _ready_frames
+        self.streamer._chunking_thread = object()
+        self.streamer._chunk_passthrough = False
+
+    def tearDown(self):
+        self.streamer._chunking_thread = None
+        super().tearDown()
+
+    def test_behind_consumer_drops_oldest_and_recycles_its_slot(self):
+        ring = FrameRing((2, 2, 3), Streamer._frame_ring_size)
+        slot = ring.acquire()
+        for _ in range(10):
+            published = slot
+            slot = self.streamer._handle_frame(ring, slot)
+            self.assertNotEqual(slot, published)
+            self.assertLessEqual(len(self.streamer._ready_frames), Streamer._max_ready_frames)
+            held = [s for _, s in self.streamer._ready_frames]
+            self.assertNotIn(slot, held)
+            # Every slot is either held by capture, published, or free
+            self.assertEqual(sorted(held + [slot] + list(ring._free)),
+                             list(range(Streamer._frame_ring_size)))
+
+    def test_exhausted_ring_reuses_capture_slot(self):
+        ring = FrameRing((2, 2, 3), 2)
+        first = ring.acquire()
+        slot = self.streamer._handle_frame(ring, first)
+        # The only spare slot is published; the next frame overwrites ours
+        self.assertEqual(self.streamer._handle_frame(ring, slot), slot)
+        self.assertEqual(list(self.streamer._ready_frames), [(ring, first)])
+
+    def test_chunking_exit_releases_published_slots(self):
+        ring = FrameRing((2, 2, 3), Streamer._frame_ring_size)
+        slot = ring.acquire()
+        slot = self.streamer._handle_frame(ring, slot)
+        slot = self.streamer._handle_frame(ring, slot)
+        self.assertEqual(len(self.streamer._ready_frames), 2)
+        # Chunking disabled: the loop exits at once
+        self.streamer._chunking_enabled = False
+        self.streamer._chunking_loop()
+        self.assertEqual(len(self.streamer._ready_frames), 0)
+        # Only the capture slot is still in use
+        self.assertEqual(sorted(list(ring._free) + [slot]), list(range(Streamer._frame_ring_size)))
+
+    def test_gray_frames_are_not_published(self):
+        ring = FrameRing((2, 2), 2)
+        slot = ring.acquire()
+        self.assertEqual(self.streamer._handle_frame(ring, slot), slot)
+        self.assertEqual(len(self.streamer._ready_frames), 0)
+
+
+class TestEventLog(StreamerTestCase):
+
+    def log(self, count):
+        """Write `count` events, alternating status as _process_motion does."""
+        for i in range(count):
+            self.streamer._log_motion_event('motion' if i % 2 else 'idle', i)
+
+    def test_compaction_keeps_most_recent_lines(self):
+        self.streamer._event_keep = 3
+        self.streamer._event_compact_every = 5
+        self.log(5)
+        events = read_recent_events(self.streamer._event_file)
+        self.assertEqual([e['fps'] for e in events], [2, 3, 4])
+        self.assertFalse(self.streamer._event_file.with_suffix('.jsonl.tmp').exists())
+        # The reopened handle keeps appending after compaction
+        self.log(2)
+        events = read_recent_events(self.streamer._event_file)
+        self.assertEqual([e['fps'] for e in events], [2, 3, 4, 0, 1])
+
+    def test_read_recent_events_returns_last_n(self):
+        self.log(10)
+        events = read_recent_events(self.streamer._event_file, n=4)
+        self.assertEqual([e['fps'] for e in events], [6, 7, 8, 9])
+
+    def test_torn_line_is_terminated_and_skipped(self):
+        self.log(2)
+        self.streamer._event_fh.write('{"timestamp":"2024')
+        self.streamer._event_fh.close()
+        self.streamer._open_event_log()
+        self.streamer._log_motion_event('motion', 5)
+        events = read_recent_events(self.streamer._event_file)
+        self.assertEqual([e['fps'] for e in events], [0, 1, 5])
+
+
+class TestArgvCache(StreamerTestCase):
+
+    def test_argv_cached_per_streamer(self):
+        other = Streamer(os.path.join(self._tmp, 'other.mp4'), dict(self.config), 'other')
+        other._start_ffmpeg = lambda: None
+        try:
+            argv = self.streamer._build_ffmpeg_command()
+            self.assertIn(os.path.join(self._tmp, 'other.mp4'), other._build_ffmpeg_command())
+            self.assertEqual(self.streamer._build_ffmpeg_command(), argv)
+            self.assertEqual(len(self.streamer._argv_cache), 1)
+            self.assertEqual(len(other._argv_cache), 1)
+        finally:
+            other.stop()
+
+    def test_returned_argv_is_a_copy(self):
+        self.streamer._build_ffmpeg_command().append('-extra')
+        self.assertNotIn('-extra', self.streamer._build_ffmpeg_command())
+
+
+class TestFfmpegWatcher(StreamerTestCase):
+
+    def test_found_ffmpeg_starts_pipeline_on_its_own_thread(self):
+        started = threading.Event()
+        threads = []
+
+        def start_ffmpeg():
+            threads.append(threading.current_thread())
+            started.set()
+        self.streamer._start_ffmpeg = start_ffmpeg
+        with patch.object(Streamer, '_ffmpeg_path', None), \
+                patch('streamer.shutil.which', return_value='/usr/bin/ffmpeg'):
+            Streamer._ffmpeg_watcher()
+        self.assertTrue(started.wait(5))
+        # Started by the streamer's pipeline thread, under _pipeline_lock
+        self.assertIsNot(threads[0], threading.current_thread())
+
+
+class TestStop(StreamerTestCase):
+
+    def test_no_ffmpeg_spawned_after_stop(self):
+        calls = []
+        self.streamer._start_ffmpeg = lambda: calls.append(1)
+        self.streamer.stop()
+        self.streamer._restart_pipeline()
+        self.assertEqual(calls, [])
+        with patch('streamer.subprocess.Popen') as popen:
+            Streamer._start_ffmpeg(self.streamer)
+        popen.assert_not_called()
+
+    def test_stop_waits_for_restart_in_progress(self):
+        self.streamer._pipeline_lock.acquire()
+        stopper = threading.Thread(target=self.streamer.stop)
+        stopper.start()
+        stopper.join(0.2)
+        # stop() cannot terminate until the restart releases the lock
+        self.assertTrue(stopper.is_alive())
+        self.streamer._pipeline_lock.release()
+        stopper.join(5)
+        self.assertFalse(stopper.is_alive())
+
+
+class TestLogListener(StreamerTestCase):
+
+    def test_streamer_created_while_last_one_stops_keeps_logging(self):
+        open_event_log = Streamer._open_event_log
+
+        def stop_other_then_open(streamer):
+            # The only other streamer stops while this one is being built
+            self.streamer.stop()
+            open_event_log(streamer)
+        with patch.object(Streamer, '_open_event_log', stop_other_then_open):
+            other = Streamer(os.path.join(self._tmp, 'other.mp4'), dict(self.config), 'other')
+        other._start_ffmpeg = lambda: None
+        self.assertIsNotNone(Streamer._log_listener)
+        other.logger.info("still logged")
+        other.stop()
+        self.assertIsNone(Streamer._log_listener)
+        with open(os.path.join('logs', 'other.log'), encoding='utf-8') as f:
+            self.assertIn("still logged", f.read())
+
+
+@unittest.skipIf(os.name == 'nt', "the shared stderr selector is POSIX only")
+class TestStderrLoop(StreamerTestCase):
+
+    def spawn(self, text):
+        proc = subprocess.Popen([sys.executable, '-c', f'import sys; sys.stderr.write({text!r})'],
+                                stderr=subprocess.PIPE)
+        self.addCleanup(proc.wait)
+        return proc
+
+    def test_error_on_one_pipe_keeps_draining_the_others(self):
+        class BrokenTail(list):
+            def append(self, line):
+                raise RuntimeError("broken tail")
+
+        self.streamer._watch_stderr(self.spawn("bad\n"), BrokenTail())
+        proc = self.spawn("ok 1\nok 2\n")
+        tail = []
+        self.streamer._watch_stderr(proc, tail)
+        deadline = time.monotonic() + 5
+        while not proc.stderr.closed and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(tail, ['ok 1', 'ok 2'])
+
+
+class TestDecoderError(unittest.TestCase):
+    """Lines are from ffmpeg 7 stderr."""
+
+    def test_decoder_failures(self):
+        for line in ("[h264_v4l2m2m @ 0x172c4e80] Could not find a valid device",
+                     "[vist#0:0/h264 @ 0x172c85c0] [dec:h264_v4l2m2m @ 0x172c6b40] "
+                     "Error while opening decoder: Invalid argument",
+                     "Failed to initialise hwaccel"):
+            self.assertTrue(_is_decoder_error(line, 'h264_v4l2m2m'), line)
+
+    def test_offline_camera_is_not_a_decoder_failure(self):
+        for line in ("[tcp @ 0x117dda40] Connection to tcp://127.0.0.1:1?timeout=0 failed: "
+                     "Connection refused",
+                     "[in#0 @ 0x117dab00] Error opening input: Connection refused",
+                     "Error opening input file rtsp://127.0.0.1:1/x.",
+                     "[rtsp @ 0x5586] method DESCRIBE failed: 404 Not Found",
+                     "Stream mapping:",
+                     "  Stream #0:0 -> #0:0 (h264 (h264_v4l2m2m) -> rawvideo (native))"):
+            self.assertFalse(_is_decoder_error(line, 'h264_v4l2m2m'), line)
+
+
+class TestQuietOpenCV(unittest.TestCase):
+
+    def test_overlapping_blocks_restore_level_once(self):
+        level = _cv_logging.getLogLevel()
+        with Streamer._quiet_opencv():
+            with Streamer._quiet_opencv():
+                self.assertEqual(_cv_logging.getLogLevel(), _CV_LOG_LEVEL_ERROR)
+            # Another capture thread is still inside its retrieve
+            self.assertEqual(_cv_logging.getLogLevel(), _CV_LOG_LEVEL_ERROR)
+        self.assertEqual(_cv_logging.getLogLevel(), level)
+
+    def test_level_restored_on_error(self):
+        level = _cv_logging.getLogLevel()
+        with self.assertRaises(RuntimeError):
+            with Streamer._quiet_opencv():
+                raise RuntimeError
+        self.assertEqual(_cv_logging.getLogLevel(), level)
+
+
+if __name__ == '__main__':
+    unittest.main()